@@ -110,11 +110,11 @@ def get_tsai_sec_2_2_3_data(
         .astype(int)
         .rename("income_bin")
     )
-    df_vehicle_ownership_agg: pd.DataFrame = df_vehicle_ownership.groupby(
-        s_income_bin
-    ).agg(
-        {"adjusted_income": np.mean, "adjusted_vehicle_ownership": np.mean}
-    )  # type: ignore
+    df_vehicle_ownership_agg: pd.DataFrame = (
+        df_vehicle_ownership[["adjusted_income", "adjusted_vehicle_ownership"]]
+        .groupby(s_income_bin)
+        .mean()
+    )
 
     return df_vehicle_ownership_agg
 
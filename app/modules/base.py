@@ -1,39 +1,207 @@
 import abc
 import dataclasses
+import functools
 import itertools
-import random
-from collections.abc import Iterable
+import linecache
+from collections.abc import Callable, Iterable, Mapping
 from typing import Any
 
+import joblib
 import numpy as np
+import scipy.optimize
 import sympy as sp
 from absl import logging
 
+try:
+    import numba
+except ImportError:  # numba is optional
+    numba = None
+
+
+def _clear_lambdify_linecache() -> None:
+    # `sp.lambdify` keeps the generated source in `linecache` for as long as the function
+    # lives, and the functions we cache live as long as their modules
+    for filename in list(linecache.cache):
+        if filename.startswith("<lambdifygenerated-"):
+            del linecache.cache[filename]
+
+
+def _jit(fn: Callable) -> Callable:
+    if numba is None:
+        return fn
+
+    jitted_fn: Callable | None = numba.njit(fn)
+
+    @functools.wraps(fn)
+    def _fn(*args: Any) -> Any:
+        nonlocal jitted_fn
+
+        if jitted_fn is not None:
+            try:
+                return jitted_fn(*args)
+            except numba.core.errors.NumbaError as e:
+                logging.debug(f"Falling back to numpy as numba failed to compile: {e}")
+                jitted_fn = None
+
+        return fn(*args)
+
+    return _fn
+
+
+def _vectorize(fn: Callable, num_args: int) -> Callable:
+    if numba is None:
+        return fn
+
+    # a ufunc broadcasts its arguments itself, which `numba.njit(parallel=True)` does
+    # not do for arrays of differing shapes; it stays single threaded, as modules are
+    # already evaluated from within worker processes
+    signature: str = f"float64({', '.join(['float64'] * num_args)})"
+    try:
+        return numba.vectorize([signature], target="cpu")(fn)
+    except numba.core.errors.NumbaError as e:
+        logging.debug(f"Falling back to numpy as numba failed to compile: {e}")
+        return fn
+
+
+@functools.lru_cache(maxsize=None)
+def get_numpy_func(output: sp.Basic, args: tuple[sp.Basic, ...]) -> Callable:
+    fn: Callable = sp.lambdify(args, output, modules=["scipy", "numpy"], cse=True)
+    _clear_lambdify_linecache()
+
+    return fn
+
+
+def _is_numeric(value: Any) -> bool:
+    if isinstance(value, np.ndarray):
+        return value.dtype.kind in "biuf"
+
+    return isinstance(value, (int, float, np.number))
+
 
 @dataclasses.dataclass(kw_only=True)  # type: ignore
 class BaseModule(abc.ABC):
+    @classmethod
+    def _evalf(cls, value: Any) -> Any:
+        if isinstance(value, sp.Tuple):
+            return sp.Tuple(*[cls._evalf(_value) for _value in value])
+
+        return sp.sympify(value).evalf()
+
+    @classmethod
+    def _subs_leaves(cls, leaves: list[sp.Basic], *args: Any, **kwargs: Any) -> list:
+        # `xreplace` is a single hash-based tree walk, and is equivalent to `subs` when
+        # only plain symbols are being replaced
+        if (
+            len(args) == 1
+            and not kwargs
+            and isinstance(args[0], Mapping)
+            and all(isinstance(key, sp.Symbol) for key in args[0])
+        ):
+            mapping: Mapping = args[0]
+            return [cls._evalf(leaf.xreplace(mapping)) for leaf in leaves]
+
+        return [cls._evalf(leaf.subs(*args, **kwargs)) for leaf in leaves]
+
+    # trust region reflective least squares, for `_fit` implementations to opt into
+    @classmethod
+    def _solve_lsq(
+        cls,
+        residual_fn: Callable[[np.ndarray], np.ndarray],
+        x0: np.ndarray,
+        jac: Callable[[np.ndarray], np.ndarray] | None = None,
+        bounds: tuple[Any, Any] | None = None,
+    ) -> np.ndarray:
+        result: scipy.optimize.OptimizeResult = scipy.optimize.least_squares(
+            residual_fn,
+            x0,
+            jac=jac or "2-point",
+            method="trf",
+            bounds=bounds or (-np.inf, np.inf),
+            x_scale="jac",
+        )
+        if not result.success:
+            logging.warning(f"Least squares did not converge: {result.message}")
+
+        return result.x
+
     @classmethod
     def subs(cls, value: Any, *args: Any, **kwargs: Any) -> Any:
-        if isinstance(value, sp.Basic):
-            return value.subs(*args, **kwargs).evalf()
+        # numbers have nothing left to substitute
+        if isinstance(value, np.generic) or _is_numeric(value):
+            return value
 
-        if isinstance(value, list):
-            return [cls.subs(_value, *args, **kwargs) for _value in value]
+        # walk the containers with an explicit stack, noting where each expression sits
+        # so that all of them can be substituted in one batch
+        root: list[Any] = [None]
+        leaves: list[sp.Basic] = []
+        slots: list[tuple[Any, Any]] = []
+        tuple_slots: list[tuple[Any, Any]] = []
 
-        if isinstance(value, dict):
-            return {
-                key: cls.subs(_value, *args, **kwargs) for key, _value in value.items()
-            }
+        stack: list[tuple[Any, Any, Any]] = [(value, root, 0)]
+        while stack:
+            _value, parent, key = stack.pop()
 
-        raise NotImplementedError
+            if isinstance(_value, sp.Basic):
+                leaves.append(_value)
+                slots.append((parent, key))
+
+            elif isinstance(_value, np.generic) or _is_numeric(_value):
+                parent[key] = _value
+
+            # object arrays such as `sp.symarray` hold expressions element by element
+            elif isinstance(_value, np.ndarray):
+                _array: np.ndarray = np.empty(_value.shape, dtype=object)
+                parent[key] = _array
+
+                stack.extend((v, _array, i) for i, v in np.ndenumerate(_value))
+
+            elif isinstance(_value, (list, tuple)):
+                _list: list[Any] = [None] * len(_value)
+                parent[key] = _list
+                if isinstance(_value, tuple):
+                    tuple_slots.append((parent, key))
+
+                stack.extend((v, _list, i) for i, v in enumerate(_value))
+
+            elif isinstance(_value, dict):
+                _dict: dict[Any, Any] = dict.fromkeys(_value)
+                parent[key] = _dict
+
+                stack.extend((v, _dict, k) for k, v in _value.items())
+
+            else:
+                raise NotImplementedError
+
+        substituted: list = cls._subs_leaves(leaves, *args, **kwargs)
+        for (parent, key), leaf in zip(slots, substituted):
+            parent[key] = leaf
+
+        # tuples are immutable, so they are filled as lists and converted innermost first
+        for parent, key in reversed(tuple_slots):
+            parent[key] = tuple(parent[key])
+
+        return root[0]
 
     @abc.abstractmethod
     def output(self) -> Any:
         ...
 
+    # fitting only changes the parameters substituted in, never the expressions
+    @functools.cached_property
+    def _cached_output(self) -> Any:
+        return self.output()
+
+    @functools.cached_property
+    def _symbol_by_name(self) -> dict[str, sp.Symbol]:
+        return {
+            name: value
+            for name, value in vars(self).items()
+            if isinstance(value, sp.Symbol)
+        }
+
     def __call__(self, output: Any = None, **inputs: float | sp.Basic) -> Any:
         if output is None:
-            output = self.output()
+            output = self._cached_output
 
         input_by_symbol: dict[sp.Symbol, sp.Basic] = {}
         for k, v in inputs.items():
@@ -53,67 +221,250 @@ class BaseModule(abc.ABC):
 
 @dataclasses.dataclass(kw_only=True)  # type: ignore
 class Module(BaseModule):
-    param_by_symbol: dict[sp.Basic, float] | None = None
+    # the fitted parameters as sympy floats for substitution, and as python floats
+    param_by_symbol: dict[sp.Basic, sp.Expr] | None = None
+    param_values: dict[sp.Basic, float] | None = None
+    # "numba" compiles the lambdified functions, which only pays off for outputs
+    # evaluated many times over, and requires the optional numba extra
+    backend: str = "numpy"
 
     @property
     def is_fitted(self) -> bool:
         return self.param_by_symbol is not None
 
+    # the caches are rebuilt lazily, and lambdified functions cannot be pickled anyways
+    def __getstate__(self) -> dict[str, Any]:
+        state: dict[str, Any] = self.__dict__.copy()
+        state.pop("_lambdified", None)
+
+        return state
+
+    @functools.cached_property
+    def _rng(self) -> np.random.Generator:
+        return np.random.default_rng()
+
+    # keyed by the output expression, the symbols it is evaluated against, and whether
+    # it is evaluated over arrays
+    @functools.cached_property
+    def _lambdified(
+        self,
+    ) -> dict[tuple[sp.Basic, tuple[sp.Basic, ...], bool], Callable]:
+        return {}
+
+    def _lambdify(
+        self, output: sp.Basic, symbols: tuple[sp.Basic, ...], vectorized: bool = False
+    ) -> Callable:
+        key: tuple[sp.Basic, tuple[sp.Basic, ...], bool] = (
+            output,
+            symbols,
+            vectorized,
+        )
+
+        fn: Callable | None = self._lambdified.get(key)
+        if fn is None:
+            fn = get_numpy_func(output, symbols)
+            if self.backend == "numba":
+                fn = _vectorize(fn, len(symbols)) if vectorized else _jit(fn)
+
+            self._lambdified[key] = fn
+
+        return fn
+
     @abc.abstractmethod
     def _fit(self, *args: Any, **kwargs: Any) -> dict[sp.Basic, float]:
         ...
 
-    def fit(self, bootstrap: bool = True, *args: Any, **kwargs: Any) -> None:
-        sampled_index: np.ndarray | None = None
+    # subclasses which can estimate from weighted samples override this to fit all the
+    # bootstrap replicates at once, `weights` being of shape (runs, num_samples)
+    def _fit_weighted(
+        self, weights: np.ndarray, *args: Any, **kwargs: Any
+    ) -> list[dict[sp.Basic, float]]:
+        raise NotImplementedError
+
+    @classmethod
+    def _resample(
+        cls, sampled_index: np.ndarray, args: tuple, kwargs: dict[str, Any]
+    ) -> tuple[tuple, dict[str, Any]]:
+        args = tuple(
+            [arg[sampled_index] if isinstance(arg, np.ndarray) else arg for arg in args]
+        )
+        kwargs = {
+            key: arg[sampled_index] if isinstance(arg, np.ndarray) else arg
+            for key, arg in kwargs.items()
+        }
+        return args, kwargs
+
+    @classmethod
+    def _num_samples(cls, args: tuple, kwargs: dict[str, Any]) -> int:
+        num_samples_set: set[int] = {
+            arg.shape[0]
+            for arg in itertools.chain(args, kwargs.values())
+            if isinstance(arg, np.ndarray)
+        }
+        if len(num_samples_set) == 0:
+            raise ValueError("At least one argument must be provided")
+
+        if len(num_samples_set) != 1:
+            raise ValueError("All arguments must have the same length")
+
+        return num_samples_set.pop()
 
+    def fit(self, bootstrap: bool = True, *args: Any, **kwargs: Any) -> None:
         if bootstrap:
-            for arg in itertools.chain(args, kwargs.values()):
-                if not isinstance(arg, np.ndarray):
-                    continue
+            num_samples: int = self._num_samples(args, kwargs)
+            sampled_index: np.ndarray = self._rng.integers(
+                0, num_samples, size=num_samples, dtype=np.int64
+            )
+            args, kwargs = self._resample(sampled_index, args, kwargs)
 
-                if sampled_index is None:
-                    sampled_index = np.random.choice(
-                        len(arg), size=len(arg), replace=True
-                    )
+        self.param_values = self._fit(*args, **kwargs)
+        self.param_by_symbol = {k: sp.Float(v) for k, v in self.param_values.items()}
 
-                if len(arg) != sampled_index.shape[0]:
-                    raise ValueError("All arguments must have the same length")
+    # each replicate draws its own indices from an independent child seed, so results
+    # do not depend on whether or how the replicates are spread over workers
+    def _spawn_seeds(
+        self, runs: int, rng: np.random.Generator | None = None
+    ) -> list[np.random.SeedSequence]:
+        if rng is None:
+            rng = self._rng
 
-            if sampled_index is None:
-                raise ValueError("At least one argument must be provided")
+        return np.random.SeedSequence(rng.integers(2**63)).spawn(runs)
 
-            args = tuple(
+    @classmethod
+    def _sample_index(
+        cls, seed: np.random.SeedSequence, num_samples: int
+    ) -> np.ndarray:
+        return np.random.default_rng(seed).integers(0, num_samples, size=num_samples)
+
+    def fit_bootstrap(
+        self,
+        runs: int,
+        *args: Any,
+        rng: np.random.Generator | None = None,
+        **kwargs: Any,
+    ) -> list[dict[sp.Basic, float]]:
+        num_samples: int = self._num_samples(args, kwargs)
+        seeds: list[np.random.SeedSequence] = self._spawn_seeds(runs, rng=rng)
+
+        if type(self)._fit_weighted is not Module._fit_weighted:
+            # how many times each sample is drawn in each of the replicates
+            weights: np.ndarray = np.stack(
                 [
-                    arg[sampled_index] if isinstance(arg, np.ndarray) else arg
-                    for arg in args
+                    np.bincount(
+                        self._sample_index(seed, num_samples), minlength=num_samples
+                    )
+                    for seed in seeds
                 ]
             )
-            kwargs = {
-                key: arg[sampled_index] if isinstance(arg, np.ndarray) else arg
-                for key, arg in kwargs.items()
-            }
+            return self._fit_weighted(weights, *args, **kwargs)
 
-        self.param_by_symbol = self._fit(*args, **kwargs)
+        param_values_list: list[dict[sp.Basic, float]] = []
+        for run, seed in enumerate(seeds):
+            logging.debug(f"Bootstrap iteration {run + 1}")
 
-    def __call__(self, output: Any = None, **inputs: float | sp.Basic) -> Any:
-        if self.param_by_symbol is None:
-            raise RuntimeError("Module has not been fitted")
+            param_values_list.append(self._fit_one(seed, num_samples, args, kwargs))
+
+        return param_values_list
+
+    def _fit_one(
+        self,
+        seed: np.random.SeedSequence,
+        num_samples: int,
+        args: tuple,
+        kwargs: dict[str, Any],
+    ) -> dict[sp.Basic, float]:
+        sampled_index: np.ndarray = self._sample_index(seed, num_samples)
+        args, kwargs = self._resample(sampled_index, args, kwargs)
+        return self._fit(*args, **kwargs)
+
+    def fit_many(
+        self,
+        runs: int,
+        *args: Any,
+        n_jobs: int = -1,
+        rng: np.random.Generator | None = None,
+        **kwargs: Any,
+    ) -> list[dict[sp.Basic, float]]:
+        num_samples: int = self._num_samples(args, kwargs)
+        seeds: list[np.random.SeedSequence] = self._spawn_seeds(runs, rng=rng)
+
+        param_values_list: list[dict[sp.Basic, float]] = joblib.Parallel(
+            n_jobs=n_jobs, backend="loky"
+        )(
+            joblib.delayed(self._fit_one)(seed, num_samples, args, kwargs)
+            for seed in seeds
+        )
+        return param_values_list
+
+    # `param_values` replaces the fitted parameters for a single numeric evaluation,
+    # e.g., with arrays stacking those of several bootstrap runs
+    def __call__(
+        self,
+        output: Any = None,
+        param_values: dict[sp.Basic, Any] | None = None,
+        **inputs: float | sp.Basic,
+    ) -> Any:
+        explicit_param_values: bool = param_values is not None
+        if param_values is None:
+            if self.param_by_symbol is None:
+                raise RuntimeError("Module has not been fitted")
+
+            param_values = self.param_values
 
         if output is None:
-            output = self.output()
+            output = self._cached_output
 
+        symbol_by_name: dict[str, sp.Symbol] = self._symbol_by_name
         input_by_symbol: dict[sp.Symbol, sp.Basic] = {
-            getattr(self, k): v for k, v in inputs.items()
+            symbol_by_name[k]: v for k, v in inputs.items()
         }
 
-        return self.subs(output, input_by_symbol | self.param_by_symbol)
+        # fully numeric evaluations skip sympy and go through a cached numpy function,
+        # reading the parameters as plain floats
+        if (
+            param_values is not None
+            and isinstance(output, sp.Expr)
+            and all(
+                _is_numeric(value)
+                for value in itertools.chain(
+                    input_by_symbol.values(), param_values.values()
+                )
+            )
+        ):
+            values: tuple[Any, ...] = (
+                *input_by_symbol.values(),
+                *param_values.values(),
+            )
+            fn: Callable = self._lambdify(
+                output,
+                (*input_by_symbol.keys(), *param_values.keys()),
+                vectorized=any(np.ndim(value) > 0 for value in values),
+            )
+            return fn(*values)
+
+        if explicit_param_values:
+            raise ValueError(
+                "Argument `param_values` is only supported for numeric evaluations"
+            )
+
+        value_by_symbol: dict[sp.Basic, Any] = input_by_symbol | self.param_by_symbol
+        return self.subs(output, value_by_symbol)
 
 
 @dataclasses.dataclass(kw_only=True)
 class BootstrapModule(Module):
     module: Module
     runs: int = 100
-    param_by_symbol_list: list[dict[sp.Basic, float]] | None = None
+    n_jobs: int = 1
+    param_by_symbol_list: list[dict[sp.Basic, sp.Expr]] | None = None
+    param_values_list: list[dict[sp.Basic, float]] | None = None
+    # resampling for the fits and the runs drawn by `run_one` both come from this, so
+    # results are reproducible by default
+    rng: np.random.Generator | None = None
+
+    def __post_init__(self) -> None:
+        if self.rng is None:
+            self.rng = np.random.default_rng(0)
 
     @property
     def is_fitted(self) -> bool:
@@ -122,6 +473,46 @@ class BootstrapModule(Module):
     def output(self) -> Any:
         return self.module.output()
 
+    def _set_module_params(self, run: int) -> None:
+        assert self.param_by_symbol_list is not None
+        assert self.param_values_list is not None
+
+        self.module.param_by_symbol = self.param_by_symbol_list[run]
+        self.module.param_values = self.param_values_list[run]
+
+    @functools.cached_property
+    def _stacked_param_values(self) -> dict[sp.Basic, np.ndarray]:
+        assert self.param_values_list is not None
+
+        return {
+            symbol: np.array(
+                [param_values[symbol] for param_values in self.param_values_list]
+            )
+            for symbol in self.param_values_list[0]
+        }
+
+    def _call_stacked(self, output: sp.Expr, **inputs: Any) -> np.ndarray:
+        shape: tuple[int, ...] = np.broadcast_shapes(
+            *(np.shape(value) for value in inputs.values())
+        )
+
+        # the runs go along a new leading axis, so every run is evaluated for every
+        # input in a single call to the lambdified function
+        param_values: dict[sp.Basic, np.ndarray] = {
+            symbol: values.reshape(-1, *(1,) * len(shape))
+            for symbol, values in self._stacked_param_values.items()
+        }
+        _output: np.ndarray = self.module.__call__(
+            output, param_values=param_values, **inputs
+        )
+
+        assert self.param_values_list is not None
+        runs_shape: tuple[int, ...] = (len(self.param_values_list), *shape)
+        if np.shape(_output) != runs_shape:
+            _output = np.array(np.broadcast_to(_output, runs_shape))
+
+        return _output
+
     def __call__(  # type: ignore
         self,
         output: Any = None,
@@ -133,7 +524,7 @@ class BootstrapModule(Module):
             raise RuntimeError("Module has not been fitted")
 
         if output is None:
-            output = self.output()
+            output = self._cached_output
 
         if run_one:
             if quantile is not None:
@@ -141,15 +532,23 @@ class BootstrapModule(Module):
                     "Argument `quantile` is ignored when `run_one` is set to `True`. "
                 )
 
-            self.module.param_by_symbol = random.choice(self.param_by_symbol_list)
+            assert self.rng is not None
+            self._set_module_params(
+                int(self.rng.integers(len(self.param_by_symbol_list)))
+            )
             return self.module.__call__(output, **inputs)
 
-        _outputs: list[Any] = []
-        for param_by_symbol in self.param_by_symbol_list:
-            self.module.param_by_symbol = param_by_symbol
+        _outputs: list[Any] | np.ndarray
+        if isinstance(output, sp.Expr) and all(map(_is_numeric, inputs.values())):
+            _outputs = self._call_stacked(output, **inputs)
 
-            _output = self.module.__call__(output, **inputs)
-            _outputs.append(_output)
+        else:
+            _outputs = []
+            for run in range(len(self.param_by_symbol_list)):
+                self._set_module_params(run)
+
+                _output = self.module.__call__(output, **inputs)
+                _outputs.append(_output)
 
         if quantile is None:
             return _outputs
@@ -160,17 +559,23 @@ class BootstrapModule(Module):
         raise NotImplementedError  # TODO
 
     def _fit(self, *args: Any, **kwargs: Any) -> list[dict[sp.Basic, float]]:  # type: ignore
-        param_by_symbol_list = []
-        for run in range(self.runs):
-            logging.debug(f"Bootstrap iteration {run + 1}")
-
-            module: Module = self.module
-            module.fit(*args, **kwargs)
-            assert module.param_by_symbol is not None
-
-            param_by_symbol_list.append(module.param_by_symbol)
-
-        return param_by_symbol_list
+        # modules that fit all replicates at once are not worth spreading over workers,
+        # and either way the replicates are drawn from the same seeds
+        if (
+            self.n_jobs == 1
+            or type(self.module)._fit_weighted is not Module._fit_weighted
+        ):
+            return self.module.fit_bootstrap(self.runs, *args, rng=self.rng, **kwargs)
+
+        return self.module.fit_many(
+            self.runs, *args, n_jobs=self.n_jobs, rng=self.rng, **kwargs
+        )
 
     def fit(self, *args: Any, **kwargs: Any) -> None:
-        self.param_by_symbol_list = self._fit(*args, **kwargs)
+        self.__dict__.pop("_stacked_param_values", None)
+
+        self.param_values_list = self._fit(*args, **kwargs)
+        self.param_by_symbol_list = [
+            {k: sp.Float(v) for k, v in param_values.items()}
+            for param_values in self.param_values_list
+        ]
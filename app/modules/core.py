@@ -3,7 +3,6 @@ from typing import Any
 
 import numpy as np
 import scipy.linalg
-import scipy.optimize
 import sklearn.metrics
 import sympy as sp
 from absl import logging
@@ -64,6 +63,42 @@ class LinearModule(Module):
         logging.debug(f"Fitted with r2={r2} and parameters: a={a}, b={b}")
         return {self.a[d]: a[d] for d in range(self.input_dims)} | {self.b: b}
 
+    def _fit_weighted(  # type: ignore
+        self, weights: np.ndarray, X: np.ndarray, y: np.ndarray, **kwargs: Any
+    ) -> list[dict[sp.Basic, float]]:
+        (num_samples, input_dims) = X.shape
+        if input_dims != self.input_dims:
+            raise ValueError(f"Expected {self.input_dims} inputs, but got {input_dims}")
+
+        # centering and scaling keeps the normal equations well conditioned
+        X_mean: np.ndarray = X.mean(axis=0) if self.bias else np.zeros(input_dims)
+        X_centered: np.ndarray = X - X_mean
+        if self.bias:
+            X_centered = np.r_["1,2,0", X_centered, np.ones(num_samples)]
+
+        X_scale: np.ndarray = np.linalg.norm(X_centered, axis=0)
+        X_scale[X_scale == 0] = 1
+        X_scaled: np.ndarray = X_centered / X_scale
+
+        # weighted least squares for all the replicates at once, i.e.,
+        # (X.T @ W @ X) @ a = X.T @ W @ y
+        XtWX: np.ndarray = np.einsum("rn,ni,nj->rij", weights, X_scaled, X_scaled)
+        XtWy: np.ndarray = np.einsum("rn,ni,n->ri", weights, X_scaled, y)
+        a_one: np.ndarray = (np.linalg.pinv(XtWX) @ XtWy[..., None])[..., 0] / X_scale
+
+        a: np.ndarray = a_one[:, :input_dims]
+        b: np.ndarray
+        if self.bias:
+            b = a_one[:, -1] - a @ X_mean
+        else:
+            b = np.zeros(len(weights))
+
+        logging.debug(f"Fitted {len(weights)} weighted replicates")
+        return [
+            {self.a[d]: a[run, d] for d in range(self.input_dims)} | {self.b: b[run]}
+            for run in range(len(weights))
+        ]
+
 
 class SigmoidCurveModule(Module):
     def __init__(self):
@@ -89,11 +124,14 @@ class SigmoidCurveModule(Module):
             "y": self.y,
         }
 
-    def _fit(self, x: np.ndarray, y: np.ndarray, **kwargs: Any) -> dict[sp.Basic, float]:  # type: ignore
+    def _fit(self, x: np.ndarray, y: np.ndarray, p0: list[float] | None = None) -> dict[sp.Basic, float]:  # type: ignore
         fn: Callable[[np.ndarray, float, float, float], np.ndarray] = sp.lambdify(
-            [self.x, self.gamma, self.alpha, self.beta], self.y
+            [self.x, self.gamma, self.alpha, self.beta], self.y, cse=True
+        )
+        gamma, alpha, beta = self._solve_lsq(
+            lambda params: fn(x, *params) - y,
+            np.ones(3) if p0 is None else np.asarray(p0, dtype=float),
         )
-        (gamma, alpha, beta), _ = scipy.optimize.curve_fit(fn, x, y, **kwargs)
         y_pred: np.ndarray = np.vectorize(fn)(x, gamma, alpha, beta)
         r2: float = sklearn.metrics.r2_score(y, y_pred)
 
@@ -127,11 +165,14 @@ class GompertzCurveModule(Module):
             "y": self.y,
         }
 
-    def _fit(self, x: np.ndarray, y: np.ndarray, **kwargs: Any) -> dict[sp.Basic, float]:  # type: ignore
+    def _fit(self, x: np.ndarray, y: np.ndarray, p0: list[float] | None = None) -> dict[sp.Basic, float]:  # type: ignore
         fn: Callable[[np.ndarray, float, float, float], np.ndarray] = sp.lambdify(
-            [self.x, self.gamma, self.alpha, self.beta], self.y
+            [self.x, self.gamma, self.alpha, self.beta], self.y, cse=True
+        )
+        gamma, alpha, beta = self._solve_lsq(
+            lambda params: fn(x, *params) - y,
+            np.ones(3) if p0 is None else np.asarray(p0, dtype=float),
         )
-        (gamma, alpha, beta), _ = scipy.optimize.curve_fit(fn, x, y, **kwargs)
         y_pred: np.ndarray = np.vectorize(fn)(x, gamma, alpha, beta)
         r2: float = sklearn.metrics.r2_score(y, y_pred)
 
@@ -167,11 +208,14 @@ class GammaCurveModule(Module):
             "y": self.y,
         }
 
-    def _fit(self, x: np.ndarray, y: np.ndarray, **kwargs: Any) -> dict[sp.Basic, float]:  # type: ignore
+    def _fit(self, x: np.ndarray, y: np.ndarray, p0: list[float] | None = None) -> dict[sp.Basic, float]:  # type: ignore
         fn: Callable[[np.ndarray, float, float, float], np.ndarray] = sp.lambdify(
-            [self.x, self.alpha, self.beta, self.C], self.y
+            [self.x, self.alpha, self.beta, self.C], self.y, cse=True
+        )
+        alpha, beta, C = self._solve_lsq(
+            lambda params: fn(x, *params) - y,
+            np.ones(3) if p0 is None else np.asarray(p0, dtype=float),
         )
-        (alpha, beta, C), _ = scipy.optimize.curve_fit(fn, x, y, **kwargs)
         y_pred: np.ndarray = np.vectorize(fn)(x, alpha, beta, C)
         r2: float = sklearn.metrics.r2_score(y, y_pred)
 
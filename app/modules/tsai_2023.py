@@ -5,7 +5,7 @@
 # https://www.sciencedirect.com/science/article/pii/S1361920922003686
 
 
-from collections.abc import Callable
+from collections.abc import Callable, Mapping
 from typing import Any, cast
 
 import numpy as np
@@ -15,7 +15,7 @@ import sympy as sp
 import sympy.stats as sps
 from absl import logging
 
-from app.modules.base import BaseModule, Module
+from app.modules.base import BaseModule, Module, get_numpy_func
 from app.modules.core import (
     GammaCurveModule,
     GompertzCurveModule,
@@ -78,7 +78,7 @@ class VehicleSurvivalRateModule(Module):
 
     def _fit(self, age: np.ndarray, survival_rate: np.ndarray) -> dict[sp.Symbol, float]:  # type: ignore
         (a, b), _ = scipy.optimize.curve_fit(
-            sp.lambdify([self.age, self.a, self.b], self.survival_rate),
+            sp.lambdify([self.age, self.a, self.b], self.survival_rate, cse=True),
             age,
             survival_rate,
             p0=[0.005, 0.5],
@@ -120,6 +120,16 @@ class IncomeDistributionModule(BaseModule):
             "income_rv": self.income_rv,
         }
 
+    # the parameters as numbers rather than sympy expressions, for evaluating the
+    # distribution with numpy or scipy, where it is a fisk distribution
+    def get_params(self, mean_income: Any, gini: Any) -> tuple[Any, Any]:
+        fn: Callable = get_numpy_func(
+            sp.Tuple(self.alpha, self.beta), (self.mean_income, self.gini)
+        )
+        alpha, beta = fn(mean_income, gini)
+
+        return alpha, beta
+
 
 # Section 2.2.3: Ownership Probability Function
 class CarOwnershipModule(GompertzCurveModule):
@@ -138,6 +148,14 @@ class CarOwnershipModule(GompertzCurveModule):
 
         return super().__call__(output, income=income_in_millions, **inputs)
 
+    # ownership as numbers, for evaluating with numpy over incomes and any number of
+    # parameter sets at once, broadcasting them against each other
+    def get_ownership(self, income: Any, param_values: Mapping[sp.Basic, Any]) -> Any:
+        fn: Callable = get_numpy_func(
+            self.ownership, (self.income, *param_values.keys())
+        )
+        return fn(income / 1_000_000, *param_values.values())
+
     def _fit(self, income: np.ndarray, ownership: np.ndarray) -> dict[sp.Basic, float]:  # type: ignore
         income_in_millions: np.ndarray = income / 1_000_000
 
@@ -166,6 +184,14 @@ class CarOwnershipModuleV2(SigmoidCurveModule):
 
         return super().__call__(output, income=income_in_millions, **inputs)
 
+    # ownership as numbers, for evaluating with numpy over incomes and any number of
+    # parameter sets at once, broadcasting them against each other
+    def get_ownership(self, income: Any, param_values: Mapping[sp.Basic, Any]) -> Any:
+        fn: Callable = get_numpy_func(
+            self.ownership, (self.income, *param_values.keys())
+        )
+        return fn(income / 1_000_000, *param_values.values())
+
     def _fit(self, income: np.ndarray, ownership: np.ndarray) -> dict[sp.Basic, float]:  # type: ignore
         income_in_millions: np.ndarray = income / 1_000_000
 
@@ -198,6 +224,14 @@ class ScooterOwnershipModule(GammaCurveModule):
 
         return super().__call__(output, income=income_in_millions, **inputs)
 
+    # ownership as numbers, for evaluating with numpy over incomes and any number of
+    # parameter sets at once, broadcasting them against each other
+    def get_ownership(self, income: Any, param_values: Mapping[sp.Basic, Any]) -> Any:
+        fn: Callable = get_numpy_func(
+            self.ownership, (self.income, *param_values.keys())
+        )
+        return fn(income / 1_000_000, *param_values.values())
+
     def _fit(self, income: np.ndarray, ownership: np.ndarray) -> dict[sp.Basic, float]:  # type: ignore
         income_in_millions: np.ndarray = income / 1_000_000
 
@@ -263,6 +297,21 @@ class TruckStockModule(LinearModule):
 
         return params
 
+    def _fit_weighted(  # type: ignore
+        self,
+        weights: np.ndarray,
+        log_gdp_per_capita: np.ndarray,
+        population: np.ndarray,
+        vehicle_stock: np.ndarray,
+    ) -> list[dict[sp.Basic, float]]:
+        params_list: list[dict[sp.Basic, float]] = super()._fit_weighted(
+            weights,
+            X=np.r_["1,2,0", log_gdp_per_capita, population],
+            y=vehicle_stock,
+        )
+
+        return params_list
+
 
 # Section 2.5: Bus Module
 class BusStockDensityModule(Module):
@@ -305,6 +354,7 @@ class BusStockDensityModule(Module):
                 self.linear.a[0],
             ],
             self.vehicle_stock_density,
+            cse=True,
         )
         (gamma, alpha, beta, a_0), _ = scipy.optimize.curve_fit(
             fn,
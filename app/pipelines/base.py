@@ -1,8 +1,12 @@
 from typing import Protocol
 
+import numpy as np
 import pandas as pd
 
 
 class PerYearPipeline(Protocol):
     def __call__(self, year: int) -> pd.DataFrame:
         ...
+
+    def predict_many(self, years: np.ndarray) -> pd.DataFrame:
+        ...
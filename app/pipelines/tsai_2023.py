@@ -1,13 +1,12 @@
 import dataclasses
 import functools
-from collections.abc import Callable, Iterable
+from collections.abc import Iterable
 from pathlib import Path
 from typing import ClassVar
 
 import numpy as np
 import pandas as pd
 import rich.progress
-import scipy.integrate
 import sympy as sp
 from absl import logging
 
@@ -43,6 +42,31 @@ from app.modules.tsai_2023 import (
 from app.pipelines.base import PerYearPipeline
 
 
+def _sample_runs(
+    vals: np.ndarray, runs: int, rng: np.random.Generator | None
+) -> np.ndarray:
+    assert rng is not None
+
+    # every year draws its own runs, as it would when predicted on its own
+    run_index: np.ndarray = rng.integers(0, len(vals), size=(runs, vals.shape[1]))
+    return np.take_along_axis(vals, run_index, axis=0)
+
+
+def _get_quantile_dataframe(
+    years: np.ndarray, quantiles: Iterable[float], column: str, vals: np.ndarray
+) -> pd.DataFrame:
+    _quantiles: np.ndarray = np.asarray(quantiles)
+
+    return pd.DataFrame(
+        {
+            "year": np.repeat(years, len(_quantiles)),
+            "percentage": np.tile(_quantiles, len(years)),
+            # index: (years, quantiles)
+            column: np.quantile(vals, _quantiles, axis=0).T.ravel(),
+        }
+    )
+
+
 @dataclasses.dataclass(kw_only=True)
 class CarStockPipeline(PerYearPipeline):
     VEHICLE: ClassVar[Vehicle] = Vehicle.CAR
@@ -51,9 +75,12 @@ class CarStockPipeline(PerYearPipeline):
     income_bins_total: int = 100
     income_bins_removed: int = 1
     bootstrap_fit_runs: int = 300
+    n_jobs: int = 1
     bootstrap_predict_runs: int = 300
     integrate_sigma: float = 64
+    integrate_nodes: int = 64
     quantiles: Iterable[float] = (0.025, 0.5, 0.975)
+    seed: int = 0
 
     income_module: LinearModule = dataclasses.field(default_factory=LinearModule)
     income_distribution_module: IncomeDistributionModule = dataclasses.field(
@@ -69,12 +96,28 @@ class CarStockPipeline(PerYearPipeline):
             self.data_dir, vehicle=self.VEHICLE, income_bins=self.income_bins_total
         )
 
+    @functools.cached_property
+    def df_income(self) -> pd.DataFrame:
+        return get_income_dataframe(self.data_dir)
+
+    # the income and ownership runs are drawn from independent streams, as they would
+    # be if each was bootstrapped on its own
+    @functools.cached_property
+    def rngs(self) -> list[np.random.Generator]:
+        return [
+            np.random.default_rng(seed)
+            for seed in np.random.SeedSequence(self.seed).spawn(2)
+        ]
+
     @functools.cached_property
     def bootstrap_income_module(self) -> BootstrapModule:
-        df_income: pd.DataFrame = get_income_dataframe(self.data_dir)
+        df_income: pd.DataFrame = self.df_income
 
         bootstrap_income_module: BootstrapModule = BootstrapModule(
-            module=self.income_module, runs=self.bootstrap_fit_runs
+            module=self.income_module,
+            runs=self.bootstrap_fit_runs,
+            n_jobs=self.n_jobs,
+            rng=self.rngs[0],
         )
         bootstrap_income_module.fit(
             X=np.r_["1,2,0", df_income.index.values],
@@ -89,7 +132,10 @@ class CarStockPipeline(PerYearPipeline):
         ).tail(-self.income_bins_removed)
 
         bootrap_vehicle_ownership_module: BootstrapModule = BootstrapModule(
-            module=self.vehicle_ownership_module, runs=self.bootstrap_fit_runs
+            module=self.vehicle_ownership_module,
+            runs=self.bootstrap_fit_runs,
+            n_jobs=self.n_jobs,
+            rng=self.rngs[1],
         )
         bootrap_vehicle_ownership_module.fit(
             income=df_vehicle_ownership_to_fit["adjusted_income"].values,
@@ -97,54 +143,96 @@ class CarStockPipeline(PerYearPipeline):
         )
         return bootrap_vehicle_ownership_module
 
+    @functools.cached_property
+    def vehicle_ownership_param_symbols(self) -> list[sp.Basic]:
+        param_values_list = self.bootstrap_vehicle_ownership_module.param_values_list
+        assert param_values_list is not None
+
+        return list(param_values_list[0].keys())
+
     def __call__(self, year: int) -> pd.DataFrame:
-        index: pd.Index = pd.Index([year], name="year")
+        return self.predict_many(np.asarray([year])).drop(columns="year")
 
-        df_income: pd.DataFrame = get_income_dataframe(self.data_dir)
+    def predict_many(self, years: np.ndarray) -> pd.DataFrame:
+        index: pd.Index = pd.Index(years, name="year")
+
+        df_income: pd.DataFrame = self.df_income
         s_gini: pd.Series = get_gini_series(self.data_dir, extrapolate_index=index)
         s_population: pd.Series = get_population_series(
             self.data_dir, extrapolate_index=index
         )
 
-        vehicle_ownership_vals: list[float] = []
-        for _ in range(self.bootstrap_predict_runs):
-            mean_income: float
-            if year in df_income.index:
-                mean_income = df_income.loc[year, "adjusted_income"]
-            else:
-                mean_income = self.bootstrap_income_module(
-                    output=self.income_module.y, x_0=year, run_one=True
-                )
+        # index: (runs, years)
+        mean_incomes: np.ndarray = _sample_runs(
+            self.bootstrap_income_module(output=self.income_module.y, x_0=years),
+            self.bootstrap_predict_runs,
+            self.bootstrap_income_module.rng,
+        )
+        is_existing: np.ndarray = np.isin(years, df_income.index)
+        mean_incomes[:, is_existing] = df_income.loc[
+            years[is_existing], "adjusted_income"
+        ].values
+
+        param_values_list = self.bootstrap_vehicle_ownership_module.param_values_list
+        assert param_values_list is not None
+
+        # index: (fit_runs, params)
+        params: np.ndarray = np.array(
+            [
+                [param_values[s] for s in self.vehicle_ownership_param_symbols]
+                for param_values in param_values_list
+            ]
+        )
+        # index: (runs, years)
+        assert self.bootstrap_vehicle_ownership_module.rng is not None
+        param_index: np.ndarray = self.bootstrap_vehicle_ownership_module.rng.integers(
+            0, len(params), size=mean_incomes.shape
+        )
+        ginis: np.ndarray = s_gini.loc[years].values
 
-            income_pdf = self.income_distribution_module(
-                output=self.income_distribution_module.income_pdf,
-                mean_income=mean_income,
-                gini=s_gini.loc[year],
-            )
-            ownership_var = self.bootstrap_vehicle_ownership_module(
-                output=self.vehicle_ownership_module.ownership,
-                income=self.income_distribution_module.income_var,
-                run_one=True,
-            )
+        # index: (runs, years)
+        alphas: np.ndarray
+        betas: np.ndarray
+        alphas, betas = np.broadcast_arrays(
+            *self.income_distribution_module.get_params(mean_incomes, ginis)
+        )
 
-            fn: Callable = sp.lambdify(
-                self.income_distribution_module.income_var,
-                ownership_var * income_pdf,
-            )
-            vehicle_ownership_val, _ = scipy.integrate.quad(
-                fn, 0, self.integrate_sigma * mean_income
-            )
-            vehicle_ownership_vals.append(vehicle_ownership_val)
+        # the integral over income is taken over the cumulative probability instead,
+        # where the integrand is bounded and smooth enough for a fixed gauss-legendre
+        # rule, and the income is recovered with the log-logistic inverse cdf
+        nodes: np.ndarray
+        weights: np.ndarray
+        nodes, weights = np.polynomial.legendre.leggauss(self.integrate_nodes)
+
+        # index: (runs, years)
+        max_probs: np.ndarray = 1 / (
+            1 + (self.integrate_sigma * mean_incomes / alphas) ** -betas
+        )
+        # index: (runs, years, nodes)
+        probs: np.ndarray = max_probs[..., None] * (nodes + 1) / 2
+        incomes: np.ndarray = alphas[..., None] * (probs / (1 - probs)) ** (
+            1 / betas[..., None]
+        )
+        ownerships: np.ndarray = self.vehicle_ownership_module.get_ownership(
+            incomes,
+            dict(
+                zip(
+                    self.vehicle_ownership_param_symbols,
+                    np.moveaxis(params[param_index], -1, 0)[..., None],
+                )
+            ),
+        )
 
-        df: pd.DataFrame = (
-            pd.Series(vehicle_ownership_vals, name="adjusted_vehicle_ownership")
-            .quantile(self.quantiles)
-            .rename_axis(index={None: "percentage"})
-            .reset_index()
-            .astype(np.float32)
+        # index: (runs, years)
+        vehicle_ownership_vals: np.ndarray = max_probs * (ownerships @ weights) / 2
+
+        df: pd.DataFrame = _get_quantile_dataframe(
+            years, self.quantiles, "adjusted_vehicle_ownership", vehicle_ownership_vals
         )
         df["vehicle_stock"] = (
-            df["adjusted_vehicle_ownership"].mul(s_population[year]).astype(int)
+            df["adjusted_vehicle_ownership"]
+            .mul(s_population.loc[df["year"]].values)
+            .astype(int)
         )
 
         return df
@@ -165,6 +253,7 @@ class OperatingCarStockPipeline(PerYearPipeline):
 
     data_dir: Path
     bootstrap_fit_runs: int = 1000
+    n_jobs: int = 1
     bootstrap_predict_runs: int = 1000
     quantiles: Iterable[float] = (0.025, 0.5, 0.975)
 
@@ -179,7 +268,9 @@ class OperatingCarStockPipeline(PerYearPipeline):
         )
 
         bootstrap_vehicle_stock_module: BootstrapModule = BootstrapModule(
-            module=self.vehicle_stock_module, runs=self.bootstrap_fit_runs
+            module=self.vehicle_stock_module,
+            runs=self.bootstrap_fit_runs,
+            n_jobs=self.n_jobs,
         )
         bootstrap_vehicle_stock_module.fit(
             gdp_per_capita=df_vehicle_stock["adjusted_gdp_per_capita"].values,
@@ -188,7 +279,10 @@ class OperatingCarStockPipeline(PerYearPipeline):
         return bootstrap_vehicle_stock_module
 
     def __call__(self, year: int) -> pd.DataFrame:
-        index: pd.Index = pd.Index([year], name="year")
+        return self.predict_many(np.asarray([year])).drop(columns="year")
+
+    def predict_many(self, years: np.ndarray) -> pd.DataFrame:
+        index: pd.Index = pd.Index(years, name="year")
 
         df_vehicle_stock: pd.DataFrame = get_tsai_sec_2_3_data(
             self.data_dir, vehicle=self.VEHICLE, extrapolate_index=index
@@ -197,24 +291,23 @@ class OperatingCarStockPipeline(PerYearPipeline):
             self.data_dir, extrapolate_index=index
         )
 
-        vehicle_stock_vals: list[float] = []
-        for _ in range(self.bootstrap_predict_runs):
-            vehicle_stock_val: float = self.bootstrap_vehicle_stock_module(
+        # index: (runs, years)
+        vehicle_stock_vals: np.ndarray = _sample_runs(
+            self.bootstrap_vehicle_stock_module(
                 output=self.vehicle_stock_module.vehicle_stock,
-                gdp_per_capita=df_vehicle_stock.loc[year, "adjusted_gdp_per_capita"],
-                run_one=True,
-            )
-            vehicle_stock_vals.append(vehicle_stock_val)
+                gdp_per_capita=df_vehicle_stock.loc[
+                    years, "adjusted_gdp_per_capita"
+                ].values,
+            ),
+            self.bootstrap_predict_runs,
+            self.bootstrap_vehicle_stock_module.rng,
+        )
 
-        df: pd.DataFrame = (
-            pd.Series(vehicle_stock_vals, name="vehicle_stock")
-            .quantile(self.quantiles)
-            .rename_axis(index={None: "percentage"})
-            .reset_index()
-            .astype(np.float32)
+        df: pd.DataFrame = _get_quantile_dataframe(
+            years, self.quantiles, "vehicle_stock", vehicle_stock_vals
         )
         df["adjusted_vehicle_ownership"] = df["vehicle_stock"].div(
-            s_population.loc[year]
+            s_population.loc[df["year"]].values
         )
 
         return df
@@ -226,6 +319,7 @@ class TruckStockPipeline(PerYearPipeline):
 
     data_dir: Path
     bootstrap_fit_runs: int = 1000
+    n_jobs: int = 1
     bootstrap_predict_runs: int = 1000
     quantiles: Iterable[float] = (0.025, 0.5, 0.975)
 
@@ -240,7 +334,9 @@ class TruckStockPipeline(PerYearPipeline):
         )
 
         bootstrap_vehicle_stock_module: BootstrapModule = BootstrapModule(
-            module=self.vehicle_stock_module, runs=self.bootstrap_fit_runs
+            module=self.vehicle_stock_module,
+            runs=self.bootstrap_fit_runs,
+            n_jobs=self.n_jobs,
         )
         bootstrap_vehicle_stock_module.fit(
             log_gdp_per_capita=df_vehicle_stock["log_gdp_per_capita"].values,
@@ -250,7 +346,10 @@ class TruckStockPipeline(PerYearPipeline):
         return bootstrap_vehicle_stock_module
 
     def __call__(self, year: int) -> pd.DataFrame:
-        index: pd.Index = pd.Index([year], name="year")
+        return self.predict_many(np.asarray([year])).drop(columns="year")
+
+    def predict_many(self, years: np.ndarray) -> pd.DataFrame:
+        index: pd.Index = pd.Index(years, name="year")
 
         df_vehicle_stock: pd.DataFrame = get_tsai_sec_2_4_data(
             self.data_dir, vehicle=self.VEHICLE, extrapolate_index=index
@@ -259,27 +358,24 @@ class TruckStockPipeline(PerYearPipeline):
             self.data_dir, extrapolate_index=index
         )
 
-        vehicle_stock_vals: list[float] = []
-        for _ in range(self.bootstrap_predict_runs):
-            vehicle_stock_val: float = self.bootstrap_vehicle_stock_module(
+        # index: (runs, years)
+        vehicle_stock_vals: np.ndarray = _sample_runs(
+            self.bootstrap_vehicle_stock_module(
                 output=self.vehicle_stock_module.vehicle_stock,
                 log_gdp_per_capita=np.log(
-                    df_vehicle_stock.loc[year, "adjusted_gdp_per_capita"]
+                    df_vehicle_stock.loc[years, "adjusted_gdp_per_capita"].values
                 ),
-                population=df_vehicle_stock.loc[year, "population"],
-                run_one=True,
-            )
-            vehicle_stock_vals.append(vehicle_stock_val)
+                population=df_vehicle_stock.loc[years, "population"].values,
+            ),
+            self.bootstrap_predict_runs,
+            self.bootstrap_vehicle_stock_module.rng,
+        )
 
-        df: pd.DataFrame = (
-            pd.Series(vehicle_stock_vals, name="vehicle_stock")
-            .quantile(self.quantiles)
-            .rename_axis(index={None: "percentage"})
-            .reset_index()
-            .astype(np.float32)
+        df: pd.DataFrame = _get_quantile_dataframe(
+            years, self.quantiles, "vehicle_stock", vehicle_stock_vals
         )
         df["adjusted_vehicle_ownership"] = df["vehicle_stock"].div(
-            s_population.loc[year]
+            s_population.loc[df["year"]].values
         )
 
         return df
@@ -291,6 +387,7 @@ class BusStockPipeline(PerYearPipeline):
 
     data_dir: Path
     bootstrap_fit_runs: int = 1000
+    n_jobs: int = 1
     bootstrap_predict_runs: int = 1000
     quantiles: Iterable[float] = (0.025, 0.5, 0.975)
 
@@ -315,7 +412,9 @@ class BusStockPipeline(PerYearPipeline):
         df_vehicle_stock = self.df_vehicle_stock
 
         bootstrap_vehicle_stock_density_module: BootstrapModule = BootstrapModule(
-            module=self.vehicle_stock_density_module, runs=self.bootstrap_fit_runs
+            module=self.vehicle_stock_density_module,
+            runs=self.bootstrap_fit_runs,
+            n_jobs=self.n_jobs,
         )
         bootstrap_vehicle_stock_density_module.fit(
             population_density=df_vehicle_stock["population_density"].values,
@@ -325,7 +424,10 @@ class BusStockPipeline(PerYearPipeline):
         return bootstrap_vehicle_stock_density_module
 
     def __call__(self, year: int) -> pd.DataFrame:
-        index: pd.Index = pd.Index([year], name="year")
+        return self.predict_many(np.asarray([year])).drop(columns="year")
+
+    def predict_many(self, years: np.ndarray) -> pd.DataFrame:
+        index: pd.Index = pd.Index(years, name="year")
 
         df_vehicle_stock: pd.DataFrame = get_tsai_sec_2_5_data(
             self.data_dir,
@@ -337,26 +439,28 @@ class BusStockPipeline(PerYearPipeline):
             self.data_dir, extrapolate_index=index
         )
 
-        vehicle_stock_density_vals: list[float] = []
-        for _ in range(self.bootstrap_predict_runs):
-            vehicle_stock_density_val: float = (
-                self.bootstrap_vehicle_stock_density_module(
-                    output=self.vehicle_stock_density_module.vehicle_stock_density,
-                    population_density=df_vehicle_stock.loc[year, "population_density"],
-                    year=year - self.min_year,
-                    run_one=True,
-                )
-            )
-            vehicle_stock_density_vals.append(vehicle_stock_density_val)
+        # index: (runs, years)
+        vehicle_stock_density_vals: np.ndarray = _sample_runs(
+            self.bootstrap_vehicle_stock_density_module(
+                output=self.vehicle_stock_density_module.vehicle_stock_density,
+                population_density=df_vehicle_stock.loc[
+                    years, "population_density"
+                ].values,
+                year=years - self.min_year,
+            ),
+            self.bootstrap_predict_runs,
+            self.bootstrap_vehicle_stock_density_module.rng,
+        )
 
-        df: pd.DataFrame = (
-            pd.Series(vehicle_stock_density_vals, name="adjusted_vehicle_ownership")
-            .quantile(self.quantiles)
-            .rename_axis(index={None: "percentage"})
-            .reset_index()
-            .astype(np.float32)
+        df: pd.DataFrame = _get_quantile_dataframe(
+            years,
+            self.quantiles,
+            "adjusted_vehicle_ownership",
+            vehicle_stock_density_vals,
+        )
+        df["vehicle_stock"] = df["adjusted_vehicle_ownership"].mul(
+            s_population.loc[df["year"]].values
         )
-        df["vehicle_stock"] = df["adjusted_vehicle_ownership"].mul(s_population[year])
 
         return df
 
@@ -1,17 +1,20 @@
+import concurrent.futures
 import enum
+import hashlib
 import itertools
 import logging as py_logging
-import warnings
-from collections.abc import Iterable
+import os
+from collections.abc import Callable, Iterable
 from pathlib import Path
 from typing import Any
 
+import matplotlib
 import numpy as np
 import pandas as pd
 import rich.progress as rp
-import scipy.integrate
+import scipy.stats
 import seaborn.objects as so
-import sympy.stats as sps
+import sympy as sp
 from absl import app, flags, logging
 
 from app.data import (
@@ -37,6 +40,7 @@ from app.modules import (
     TruckStockModule,
     VehicleSubsidyModule,
     VehicleSurvivalRateModule,
+    get_numpy_func,
 )
 from app.pipelines import (
     BusStockPipeline,
@@ -50,8 +54,12 @@ from app.pipelines import (
     VehicleCompositionPipeline,
 )
 
+# experiments run in worker processes, which should not open any GUI backend
+matplotlib.use("Agg")
+
 flags.DEFINE_string("data_dir", "./data", "Directory for data.")
 flags.DEFINE_string("result_dir", "./results", "Directory for result.")
+flags.DEFINE_bool("skip_plots", False, "Skip rendering the plots.")
 FLAGS = flags.FLAGS
 
 
@@ -63,19 +71,135 @@ class PlotGroup(int, enum.Enum):
     PREDICTION_CI_HIGH = 4
 
 
+# collects plot data column by column, with columns missing from a block left as
+# missing values
+class PlotAccumulator:
+    def __init__(self) -> None:
+        self.cols: dict[str, list[np.ndarray]] = {}
+        self.num_rows: int = 0
+
+    # numeric columns are padded with NaN, and any others with None, as NaN would be
+    # turned into the string "nan" in a column of strings
+    @classmethod
+    def _get_missing(cls, like: np.ndarray, num_rows: int) -> np.ndarray:
+        if like.dtype.kind in "iufc":
+            return np.full(num_rows, np.nan)
+
+        return np.full(num_rows, None, dtype=object)
+
+    def add_block(self, **arrays: Any) -> None:
+        (num_rows,) = np.broadcast_shapes(*(np.shape(v) for v in arrays.values()))
+
+        for name, values in self.cols.items():
+            if name not in arrays:
+                values.append(self._get_missing(values[-1], num_rows))
+
+        for name, array in arrays.items():
+            block_values: np.ndarray = np.broadcast_to(array, num_rows)
+            if name not in self.cols:
+                self.cols[name] = (
+                    [self._get_missing(block_values, self.num_rows)]
+                    if self.num_rows
+                    else []
+                )
+
+            self.cols[name].append(block_values)
+
+        self.num_rows += num_rows
+
+    def to_frame(self) -> pd.DataFrame:
+        return with_plot_dtypes(
+            pd.DataFrame(
+                {name: np.concatenate(values) for name, values in self.cols.items()},
+                copy=False,
+            )
+        )
+
+
+# seaborn lists every category of `group` in the legend, so only the groups present
+# are kept as categories
+def with_plot_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    if "year" in df and df["year"].notna().all():
+        df["year"] = df["year"].astype(np.int32)
+
+    if "percentage" in df:
+        df["percentage"] = df["percentage"].astype(np.float32)
+
+    if "group" in df:
+        df["group"] = pd.Categorical(
+            df["group"], categories=list(PlotGroup)
+        ).remove_unused_categories()
+
+    return df
+
+
+# the specification of a plot, i.e., its variables, layers, scales, labels and
+# layout, without the data it is given; it is read from private attributes of `so.Plot`,
+# so a seaborn release laid out differently has no spec, and its plots always render
+def get_plot_spec(plot: so.Plot) -> str | None:
+    try:
+        spec: dict[str, Any] = {
+            name: value
+            for name, value in vars(plot).items()
+            if name not in ["_data", "_layers", "_target"]
+        }
+        spec["_data"] = plot._data.source_vars
+        spec["_layers"] = [
+            {key: value for key, value in layer.items() if key != "source"}
+            for layer in plot._layers
+        ]
+    except AttributeError as e:
+        logging.warning(f"Plots are always rendered as their spec is unavailable: {e}")
+        return None
+
+    return repr(spec)
+
+
+# a hash of the plotted data and the plot specification is kept next to each plot,
+# and plots where neither has changed are not rendered again; delete the `.hash` file
+# to force a render
+def save_plot(
+    plot: so.Plot,
+    data: pd.DataFrame,
+    path: Path,
+    skip_plots: bool = False,
+    **kwargs: Any,
+) -> None:
+    if skip_plots:
+        return
+
+    hash_path: Path = path.with_name(f"{path.name}.hash")
+
+    plot_spec: str | None = get_plot_spec(plot)
+    if plot_spec is None:
+        plot.save(path, **kwargs)
+        hash_path.unlink(missing_ok=True)
+        return
+
+    digest: str = hashlib.sha256(
+        pd.util.hash_pandas_object(data).values.tobytes()
+        + repr(list(data.columns)).encode()
+        + plot_spec.encode()
+        + repr(kwargs).encode()
+    ).hexdigest()
+
+    if path.exists() and hash_path.exists() and hash_path.read_text() == digest:
+        logging.info(f"Skipping plot={path!s} as its data is unchanged.")
+        return
+
+    plot.save(path, **kwargs)
+    hash_path.write_text(digest)
+
+
 def plot_vehicle_sale_and_stock(
     vehicle_sale_by_year: dict[int, pd.Series],
     df_vehicle_age_composition_by_year: dict[int, pd.DataFrame],
     result_dir: Path,
     prefix: str,
+    skip_plots: bool = False,
 ):
-    df_vehicle_sale = pd.DataFrame.from_dict(
-        {
-            year: vehicle_sale.to_dict()
-            for year, vehicle_sale in vehicle_sale_by_year.items()
-        },
-        orient="index",
-    ).astype(int)
+    # the series of each year become the columns, which are turned into rows
+    df_vehicle_sale = pd.concat(vehicle_sale_by_year, axis=1).T.astype(int)
     df_vehicle_sale.index.name = "year"
     df_vehicle_sale.columns = df_vehicle_sale.columns.map(lambda x: x.value)
 
@@ -83,13 +207,13 @@ def plot_vehicle_sale_and_stock(
         df_vehicle_sale.sum(axis=1), axis=0
     )
 
-    df_vehicle_stock = pd.DataFrame.from_dict(
+    df_vehicle_stock = pd.concat(
         {
-            year: df_vehicle_age_composition.sum(axis=0).to_dict()
+            year: df_vehicle_age_composition.sum(axis=0)
             for year, df_vehicle_age_composition in df_vehicle_age_composition_by_year.items()
         },
-        orient="index",
-    ).astype(int)
+        axis=1,
+    ).T.astype(int)
     df_vehicle_stock.index.name = "year"
     df_vehicle_stock.columns = df_vehicle_stock.columns.map(lambda x: x.value)
 
@@ -118,7 +242,7 @@ def plot_vehicle_sale_and_stock(
             value_name=value_name,
         )
 
-        (
+        save_plot(
             so.Plot(
                 df_plot,
                 x="year",
@@ -135,16 +259,30 @@ def plot_vehicle_sale_and_stock(
             )
             .limit(x=(df_plot["year"].min(), df_plot["year"].max()))
             .label(x="Year", y=title)
-            .layout(size=(6, 4))
-            .save(Path(result_dir, f"{prefix}-{value_name}.pdf"), bbox_inches="tight")
+            .layout(size=(6, 4)),
+            df_plot,
+            Path(result_dir, f"{prefix}-{value_name}.pdf"),
+            bbox_inches="tight",
+            skip_plots=skip_plots,
         )
 
 
+# evaluates `output` numerically, with `inputs` given by the names of its free symbols
+def eval_module(output: sp.Expr, **inputs: float) -> Any:
+    args: tuple[sp.Symbol, ...] = tuple(
+        sorted(output.free_symbols, key=lambda symbol: symbol.name)
+    )
+    fn: Callable = get_numpy_func(output, args)
+
+    return fn(*(inputs[symbol.name] for symbol in args))
+
+
 def vehicle_subsidy(
     data_dir: Path,
     result_dir: Path,
     years: Iterable[int] = range(2012, 2051),
     predict_years: Iterable[int] = range(2023, 2051),
+    skip_plots: bool = False,
 ):
     logging.info("Running vehicle subsidy experiment.")
 
@@ -153,10 +291,13 @@ def vehicle_subsidy(
 
         s_k: pd.Series = get_nie_k_series(vehicle=vehicle)
 
-        objs: list[dict[str, Any]] = []
-        for year in predict_years:
-            subsidy_module = VehicleSubsidyModule()
+        subsidy_module = VehicleSubsidyModule()
 
+        _predict_years: np.ndarray = np.fromiter(predict_years, dtype=int)
+        # index: (years,)
+        χ_f_values: np.ndarray = np.empty(len(_predict_years))
+        χ_e_values: np.ndarray = np.empty(len(_predict_years))
+        for num, year in enumerate(_predict_years):
             inputs: dict[str, float] = {
                 "d": 9640,  # km/year
                 "f_e": 0.1266,  # kWh/km
@@ -186,19 +327,15 @@ def vehicle_subsidy(
                 "ρ_c": 0.889,
             }
 
-            output = subsidy_module(
-                output={
-                    "χ_f": subsidy_module.χ_f,
-                    "χ_e": subsidy_module.χ_e,
-                },
-                **inputs,
-            )
-
-            logging.info(f"Year {year}: {output}")
+            χ_f_values[num] = eval_module(subsidy_module.χ_f, **inputs)
+            χ_e_values[num] = eval_module(subsidy_module.χ_e, **inputs)
 
-            objs.append({"year": year} | output)
+            logging.info(f"Year {year}: χ_f={χ_f_values[num]}, χ_e={χ_e_values[num]}")
 
-        df_vehicle_subsidy = pd.DataFrame(objs).set_index("year")
+        df_vehicle_subsidy = pd.DataFrame(
+            {"χ_f": χ_f_values, "χ_e": χ_e_values},
+            index=pd.Index(_predict_years, name="year"),
+        )
         df_vehicle_market_share_predicted: pd.DataFrame = pd.DataFrame(
             {
                 Fuel.INTERNAL_COMBUSTION: df_vehicle_subsidy["χ_f"],
@@ -227,6 +364,7 @@ def vehicle_subsidy(
             df_vehicle_age_composition_by_year=df_vehicle_age_composition_by_year,
             result_dir=result_dir,
             prefix=f"{vehicle_str}-REF",
+            skip_plots=skip_plots,
         )
 
 
@@ -234,19 +372,21 @@ def tsai_2023_sec_2_2_1_experiment(
     data_dir: Path,
     result_dir: Path,
     plot_age_values: Iterable[float] = np.arange(0, 31, 0.1),
+    skip_plots: bool = False,
 ):
     logging.info("Running Tsai 2023 Section 2.2.1 experiment.")
 
-    plot_objs: list[dict[str, Any]] = []
+    plots = PlotAccumulator()
 
     for vehicle in rp.track([Vehicle.CAR, Vehicle.SCOOTER, Vehicle.OPERATING_CAR]):
         # data
 
         s: pd.Series = get_vehicle_survival_rate_series(data_dir, vehicle=vehicle)
-        plot_objs.extend(
-            s.reset_index()
-            .assign(vehicle=vehicle.value, group=PlotGroup.EXISTING)
-            .to_dict(orient="records")
+        plots.add_block(
+            age=s.index.values,
+            survival_rate=s.values,
+            vehicle=vehicle.value,
+            group=PlotGroup.EXISTING,
         )
 
         # module
@@ -254,25 +394,21 @@ def tsai_2023_sec_2_2_1_experiment(
         module = VehicleSurvivalRateModule()
         module.fit(age=s.index.values, survival_rate=s.values, bootstrap=False)
 
-        survival_rate_values = np.vectorize(module)(
-            output=module.survival_rate, age=plot_age_values
+        survival_rate_values: np.ndarray = module(
+            output=module.survival_rate, age=np.asarray(plot_age_values)
         )
 
-        plot_objs.extend(
-            pd.DataFrame(
-                {
-                    "age": plot_age_values,
-                    "survival_rate": survival_rate_values,
-                }
-            )
-            .assign(vehicle=vehicle.value, group=PlotGroup.PREDICTION)
-            .to_dict(orient="records")
+        plots.add_block(
+            age=plot_age_values,
+            survival_rate=survival_rate_values,
+            vehicle=vehicle.value,
+            group=PlotGroup.PREDICTION,
         )
 
     # plotting
 
-    df_plot: pd.DataFrame = pd.DataFrame(plot_objs)
-    (
+    df_plot: pd.DataFrame = plots.to_frame()
+    save_plot(
         so.Plot(
             df_plot,
             x="age",
@@ -303,8 +439,10 @@ def tsai_2023_sec_2_2_1_experiment(
             },
         )
         .label(x="Age (year)", y="Survival Rate")
-        .layout(size=(6, 4))
-        .save(Path(result_dir, "tsai-2023-sec-2-2-1.pdf"))
+        .layout(size=(6, 4)),
+        df_plot,
+        Path(result_dir, "tsai-2023-sec-2-2-1.pdf"),
+        skip_plots=skip_plots,
     )
 
     for vehicle in [Vehicle.CAR, Vehicle.SCOOTER, Vehicle.OPERATING_CAR]:
@@ -334,6 +472,7 @@ def tsai_2023_sec_2_2_2_experiment(
         "tab:brown",
     ],
     plot_income_values: Iterable[float] = np.linspace(0, 1_000_000, 100),
+    skip_plots: bool = False,
 ):
     logging.info("Running Tsai 2023 Section 2.2.2 experiment.")
 
@@ -347,36 +486,33 @@ def tsai_2023_sec_2_2_2_experiment(
 
     income_distribution_module = IncomeDistributionModule()
 
-    plot_objs: list[Any] = []
-    for year in plot_years:
-        logging.info(f"Running year {year}.")
+    years: np.ndarray = np.fromiter(plot_years, dtype=int)
+    income_values: np.ndarray = np.asarray(plot_income_values)
 
-        s_income: pd.Series = df_income.loc[year]
-
-        income_rv = income_distribution_module(
-            output=income_distribution_module.income_rv,
-            mean_income=s_income.adjusted_income,
-            gini=s_income.gini,
-        )
-        income_pdf_values = np.vectorize(
-            lambda income: sps.density(income_rv)(income).evalf()
-        )(plot_income_values)
+    # index: (year,)
+    alphas: np.ndarray
+    betas: np.ndarray
+    alphas, betas = income_distribution_module.get_params(
+        mean_income=df_income.loc[years, "adjusted_income"].values,
+        gini=df_income.loc[years, "gini"].values,
+    )
+    # the income distribution is log-logistic, i.e. Fisk in scipy
+    # index: (year, income)
+    income_pdf_values: np.ndarray = scipy.stats.fisk.pdf(
+        income_values, c=betas[:, None], scale=alphas[:, None]
+    )
 
-        plot_objs.extend(
-            pd.DataFrame(
-                {
-                    "income": plot_income_values,
-                    "income_pdf": income_pdf_values,
-                }
-            )
-            .assign(year=year)
-            .to_dict(orient="records")
-        )
+    plots = PlotAccumulator()
+    plots.add_block(
+        income=np.tile(income_values, len(years)),
+        income_pdf=income_pdf_values.ravel(),
+        year=np.repeat(years, len(income_values)),
+    )
 
     # plotting
 
-    df_plot: pd.DataFrame = pd.DataFrame(plot_objs)
-    (
+    df_plot: pd.DataFrame = plots.to_frame()
+    save_plot(
         so.Plot(
             df_plot,
             x="income",
@@ -386,8 +522,10 @@ def tsai_2023_sec_2_2_2_experiment(
         .add(so.Line())
         .scale(color=dict(zip(plot_years, plot_year_colors)))
         .label(x="Disposable Income", y="Probability Density")
-        .layout(size=(6, 4))
-        .save(Path(result_dir, "tsai-2023-sec-2-2-2.pdf"))
+        .layout(size=(6, 4)),
+        df_plot,
+        Path(result_dir, "tsai-2023-sec-2-2-2.pdf"),
+        skip_plots=skip_plots,
     )
 
 
@@ -397,8 +535,10 @@ def tsai_2023_sec_2_2_3_experiment(
     income_bins_total: int = 100,
     income_bins_removed: int = 1,
     bootstrap_runs: int = 100,
+    n_jobs: int = 1,
     plot_income_values: Iterable[float] = np.linspace(0, 2_000_000, 100),
     plot_ownership_quantiles: Iterable[float] = np.arange(0, 1.001, 0.1),
+    skip_plots: bool = False,
 ):
     logging.info("Running Tsai 2023 Section 2.2.3 experiment.")
 
@@ -416,10 +556,11 @@ def tsai_2023_sec_2_2_3_experiment(
             -income_bins_removed
         ).tail(-income_bins_removed)
 
-        plot_objs: list[dict[str, Any]] = (
-            df_vehicle_ownership.reset_index()
-            .assign(percentage=-1, group=PlotGroup.EXISTING)
-            .to_dict(orient="records")
+        plots = PlotAccumulator()
+        plots.add_block(
+            **df_vehicle_ownership.reset_index(),
+            percentage=-1,
+            group=PlotGroup.EXISTING,
         )
 
         # module
@@ -432,7 +573,9 @@ def tsai_2023_sec_2_2_3_experiment(
         else:
             raise ValueError(f"Unknown vehicle_str type: {vehicle}.")
 
-        bootstrap_module = BootstrapModule(module=module, runs=bootstrap_runs)
+        bootstrap_module = BootstrapModule(
+            module=module, runs=bootstrap_runs, n_jobs=n_jobs
+        )
         bootstrap_module.fit(
             income=df_vehicle_ownership_to_fit.adjusted_income.values,
             ownership=df_vehicle_ownership_to_fit.adjusted_vehicle_ownership.values,
@@ -440,30 +583,28 @@ def tsai_2023_sec_2_2_3_experiment(
 
         # predictions
 
-        df_predictions: list[pd.DataFrame] = []
-        for income in plot_income_values:
-            ownership_values = bootstrap_module(output=module.ownership, income=income)
+        # index: (run, income)
+        ownership_values: np.ndarray = bootstrap_module(
+            output=module.ownership, income=np.asarray(plot_income_values)
+        )
 
-            df_predictions.append(
-                pd.DataFrame(
-                    {"adjusted_vehicle_ownership": map(float, ownership_values)}
-                ).assign(adjusted_income=income)
-            )
+        # index: (percentage, income)
+        quantiles: np.ndarray = np.asarray(plot_ownership_quantiles)
+        ownership_quantiles: np.ndarray = np.quantile(
+            ownership_values, quantiles, axis=0
+        )
 
-        plot_objs.extend(
-            pd.concat(df_predictions, ignore_index=True)
-            .groupby("adjusted_income")
-            .quantile(plot_ownership_quantiles)
-            .rename_axis(index={None: "percentage"})
-            .reset_index()
-            .assign(group=PlotGroup.PREDICTION)
-            .to_dict(orient="records")
+        plots.add_block(
+            adjusted_income=np.tile(plot_income_values, len(quantiles)),
+            percentage=np.repeat(quantiles, len(plot_income_values)),
+            adjusted_vehicle_ownership=ownership_quantiles.ravel(),
+            group=PlotGroup.PREDICTION,
         )
 
         # plotting
 
-        df_plot: pd.DataFrame = pd.DataFrame(plot_objs)
-        (
+        df_plot: pd.DataFrame = plots.to_frame()
+        save_plot(
             so.Plot(
                 df_plot,
                 x="adjusted_income",
@@ -497,8 +638,10 @@ def tsai_2023_sec_2_2_3_experiment(
                 y=(0, 0.8),
             )
             .label(x="Disposable Income", y=f"{vehicle_title} Ownership")
-            .layout(size=(6, 4))
-            .save(Path(result_dir, f"tsai-2023-sec-2-2-3-{vehicle_str}.pdf"))
+            .layout(size=(6, 4)),
+            df_plot,
+            Path(result_dir, f"tsai-2023-sec-2-2-3-{vehicle_str}.pdf"),
+            skip_plots=skip_plots,
         )
 
 
@@ -506,8 +649,10 @@ def tsai_2023_sec_2_3_experiment(
     data_dir: Path,
     result_dir: Path,
     bootstrap_runs: int = 100,
+    n_jobs: int = 1,
     plot_gdp_per_capita_values: Iterable[float] = np.linspace(600_000, 1_500_000, 100),
     plot_stock_quantiles: Iterable[float] = np.arange(0, 1.001, 0.1),
+    skip_plots: bool = False,
 ):
     logging.info("Running Tsai 2023 Section 2.3 experiment.")
 
@@ -517,45 +662,43 @@ def tsai_2023_sec_2_3_experiment(
     # data
 
     df_vehicle_stock: pd.DataFrame = get_tsai_sec_2_3_data(data_dir, vehicle=vehicle)
-    plot_objs: list[dict[str, Any]] = (
-        df_vehicle_stock.reset_index()
-        .assign(percentage=-1, group=PlotGroup.EXISTING)
-        .to_dict(orient="records")
+    plots = PlotAccumulator()
+    plots.add_block(
+        **df_vehicle_stock.reset_index(), percentage=-1, group=PlotGroup.EXISTING
     )
 
     # module
 
     module = OperatingCarStockModule()
-    bootstrap_module = BootstrapModule(module=module, runs=bootstrap_runs)
+    bootstrap_module = BootstrapModule(
+        module=module, runs=bootstrap_runs, n_jobs=n_jobs
+    )
     bootstrap_module.fit(
         gdp_per_capita=df_vehicle_stock.adjusted_gdp_per_capita.values,
         vehicle_stock=df_vehicle_stock.vehicle_stock.values,
     )
 
-    df_predictions: list[pd.DataFrame] = []
-    for gdp_per_capita in plot_gdp_per_capita_values:
-        vehicle_stock_values = bootstrap_module(
-            output=module.vehicle_stock, gdp_per_capita=gdp_per_capita
-        )
+    # index: (run, gdp_per_capita)
+    vehicle_stock_values: np.ndarray = bootstrap_module(
+        output=module.vehicle_stock,
+        gdp_per_capita=np.asarray(plot_gdp_per_capita_values),
+    )
 
-        df_predictions.append(
-            pd.DataFrame({"vehicle_stock": map(float, vehicle_stock_values)}).assign(
-                adjusted_gdp_per_capita=gdp_per_capita
-            )
-        )
+    # index: (percentage, gdp_per_capita)
+    quantiles: np.ndarray = np.asarray(plot_stock_quantiles)
+    vehicle_stock_quantiles: np.ndarray = np.quantile(
+        vehicle_stock_values, quantiles, axis=0
+    )
 
-    plot_objs.extend(
-        pd.concat(df_predictions, ignore_index=True)
-        .groupby("adjusted_gdp_per_capita")
-        .quantile(plot_stock_quantiles)
-        .rename_axis(index={None: "percentage"})
-        .reset_index()
-        .assign(group=PlotGroup.PREDICTION)
-        .to_dict(orient="records")
+    plots.add_block(
+        adjusted_gdp_per_capita=np.tile(plot_gdp_per_capita_values, len(quantiles)),
+        percentage=np.repeat(quantiles, len(plot_gdp_per_capita_values)),
+        vehicle_stock=vehicle_stock_quantiles.ravel(),
+        group=PlotGroup.PREDICTION,
     )
 
-    df_plot: pd.DataFrame = pd.DataFrame(plot_objs)
-    (
+    df_plot: pd.DataFrame = plots.to_frame()
+    save_plot(
         so.Plot(
             df_plot,
             x="adjusted_gdp_per_capita",
@@ -585,8 +728,10 @@ def tsai_2023_sec_2_3_experiment(
             },
         )
         .label(x="GDP per Capita", y=f"{vehicle_title} Stock")
-        .layout(size=(6, 4))
-        .save(Path(result_dir, "tsai-2023-sec-2-3.pdf"))
+        .layout(size=(6, 4)),
+        df_plot,
+        Path(result_dir, "tsai-2023-sec-2-3.pdf"),
+        skip_plots=skip_plots,
     )
 
 
@@ -594,7 +739,9 @@ def tsai_2023_sec_2_4_experiment(
     data_dir: Path,
     result_dir: Path,
     bootstrap_runs: int = 100,
+    n_jobs: int = 1,
     plot_stock_quantiles: Iterable[float] = np.arange(0, 1.001, 0.1),
+    skip_plots: bool = False,
 ):
     logging.info("Running Tsai 2023 Section 2.4 experiment.")
 
@@ -608,7 +755,9 @@ def tsai_2023_sec_2_4_experiment(
     # module
 
     module = TruckStockModule()
-    bootstrap_module = BootstrapModule(module=module, runs=bootstrap_runs)
+    bootstrap_module = BootstrapModule(
+        module=module, runs=bootstrap_runs, n_jobs=n_jobs
+    )
     bootstrap_module.fit(
         log_gdp_per_capita=df_vehicle_stock.log_gdp_per_capita.values,
         population=df_vehicle_stock.population.values,
@@ -617,24 +766,30 @@ def tsai_2023_sec_2_4_experiment(
 
     # predictions
 
-    df_predictions: list[pd.DataFrame] = []
-    for _, s_vehicle_stock in df_vehicle_stock.iterrows():
-        vehicle_stock_values = bootstrap_module(
-            output=module.vehicle_stock,
-            log_gdp_per_capita=s_vehicle_stock.log_gdp_per_capita,
-            population=s_vehicle_stock.population,
-        )
+    log_gdp_per_capita_values: np.ndarray = (
+        df_vehicle_stock.log_gdp_per_capita.to_numpy()
+    )
+    population_values: np.ndarray = df_vehicle_stock.population.to_numpy()
 
-        df_predictions.append(
-            pd.DataFrame({"vehicle_stock": map(float, vehicle_stock_values)}).assign(
-                log_gdp_per_capita=s_vehicle_stock.log_gdp_per_capita,
-                population=s_vehicle_stock.population,
-            )
-        )
+    # index: (run, row)
+    vehicle_stock_values: np.ndarray = bootstrap_module(
+        output=module.vehicle_stock,
+        log_gdp_per_capita=log_gdp_per_capita_values,
+        population=population_values,
+    )
+    df_predictions: pd.DataFrame = pd.DataFrame(
+        {
+            "vehicle_stock": vehicle_stock_values.ravel(),
+            "log_gdp_per_capita": np.tile(
+                log_gdp_per_capita_values, len(vehicle_stock_values)
+            ),
+            "population": np.tile(population_values, len(vehicle_stock_values)),
+        }
+    )
 
     # plotting
 
-    plot_objs: list[dict[str, Any]]
+    plots: PlotAccumulator
     for plot_against in ["log_gdp_per_capita", "population"]:
         name: str | None = None
         xlabel: str | None = None
@@ -649,23 +804,21 @@ def tsai_2023_sec_2_4_experiment(
         assert name is not None
         assert xlabel is not None
 
-        plot_objs = (
-            df_vehicle_stock.reset_index()
-            .assign(percentage=-1, group=PlotGroup.EXISTING)
-            .to_dict(orient="records")
+        plots = PlotAccumulator()
+        plots.add_block(
+            **df_vehicle_stock.reset_index(), percentage=-1, group=PlotGroup.EXISTING
         )
-        plot_objs.extend(
-            pd.concat(df_predictions, ignore_index=True)
-            .groupby(plot_against)
+        # rows may share a value of `plot_against`, so the runs are pooled by value
+        plots.add_block(
+            **df_predictions.groupby(plot_against, sort=False)[["vehicle_stock"]]
             .quantile(plot_stock_quantiles)
             .rename_axis(index={None: "percentage"})
-            .reset_index()
-            .assign(group=PlotGroup.PREDICTION)
-            .to_dict(orient="records")
+            .reset_index(),
+            group=PlotGroup.PREDICTION,
         )
 
-        df_plot: pd.DataFrame = pd.DataFrame(plot_objs)
-        (
+        df_plot: pd.DataFrame = plots.to_frame()
+        save_plot(
             so.Plot(
                 df_plot,
                 x=plot_against,
@@ -695,8 +848,10 @@ def tsai_2023_sec_2_4_experiment(
                 },
             )
             .label(x=xlabel, y=f"{vehicle_title} Stock")
-            .layout(size=(6, 4))
-            .save(Path(result_dir, f"tsai-2023-sec-2-4-{name}.pdf"))
+            .layout(size=(6, 4)),
+            df_plot,
+            Path(result_dir, f"tsai-2023-sec-2-4-{name}.pdf"),
+            skip_plots=skip_plots,
         )
 
 
@@ -704,9 +859,11 @@ def tsai_2023_sec_2_5_experiment(
     data_dir: Path,
     result_dir: Path,
     bootstrap_runs: int = 10,
+    n_jobs: int = 1,
     plot_population_density_values: Iterable[float] = np.linspace(0, 10_000, 25),
     plot_years: Iterable[int] = np.arange(1998, 2023),
     plot_stock_quantiles: Iterable[float] = np.arange(0, 1.001, 0.1),
+    skip_plots: bool = False,
 ):
     logging.info("Running Tsai 2023 Section 2.5 experiment.")
 
@@ -722,16 +879,17 @@ def tsai_2023_sec_2_5_experiment(
     )
     min_year: int = df_vehicle_stock.year.min()
 
-    plot_objs: list[dict[str, Any]] = (
-        df_vehicle_stock.reset_index()
-        .assign(percentage=-1, group=PlotGroup.EXISTING)
-        .to_dict(orient="records")
+    plots = PlotAccumulator()
+    plots.add_block(
+        **df_vehicle_stock.reset_index(), percentage=-1, group=PlotGroup.EXISTING
     )
 
     # module
 
     module = BusStockDensityModule()
-    bootstrap_module = BootstrapModule(module=module, runs=bootstrap_runs)
+    bootstrap_module = BootstrapModule(
+        module=module, runs=bootstrap_runs, n_jobs=n_jobs
+    )
     bootstrap_module.fit(
         population_density=df_vehicle_stock.population_density.values,
         year=df_vehicle_stock.year.values - min_year,
@@ -740,39 +898,41 @@ def tsai_2023_sec_2_5_experiment(
 
     # predictions
 
-    df_predictions: list[pd.DataFrame] = []
-    for population_density, year in rp.track(
-        itertools.product(plot_population_density_values, plot_years),
-    ):
-        vehicle_stock_density_values = bootstrap_module(
-            output=module.vehicle_stock_density,
-            population_density=population_density,
-            year=year - min_year,
-        )
+    population_density_grid, year_grid = np.meshgrid(
+        np.asarray(plot_population_density_values),
+        np.asarray(plot_years) - min_year,
+        indexing="ij",
+    )
 
-        df_predictions.append(
-            pd.DataFrame(
-                {"vehicle_stock_density": map(float, vehicle_stock_density_values)}
-            ).assign(
-                population_density=population_density,
-                year=year,
-            )
-        )
+    # index: (run, population_density, year)
+    vehicle_stock_density_values: np.ndarray = bootstrap_module(
+        output=module.vehicle_stock_density,
+        population_density=population_density_grid,
+        year=year_grid,
+    )
+
+    # the runs and years are pooled together for each population density
+    # index: (percentage, population_density)
+    quantiles: np.ndarray = np.asarray(plot_stock_quantiles)
+    vehicle_stock_density_quantiles: np.ndarray = np.quantile(
+        vehicle_stock_density_values.swapaxes(0, 1).reshape(
+            len(population_density_grid), -1
+        ),
+        quantiles,
+        axis=1,
+    )
 
     # plotting
 
-    plot_objs.extend(
-        pd.concat(df_predictions, ignore_index=True)
-        .groupby("population_density")
-        .quantile(plot_stock_quantiles)
-        .rename_axis(index={None: "percentage"})
-        .reset_index()
-        .assign(group=PlotGroup.PREDICTION)
-        .to_dict(orient="records")
+    plots.add_block(
+        population_density=np.tile(plot_population_density_values, len(quantiles)),
+        percentage=np.repeat(quantiles, len(population_density_grid)),
+        vehicle_stock_density=vehicle_stock_density_quantiles.ravel(),
+        group=PlotGroup.PREDICTION,
     )
 
-    df_plot: pd.DataFrame = pd.DataFrame(plot_objs)
-    (
+    df_plot: pd.DataFrame = plots.to_frame()
+    save_plot(
         so.Plot(
             df_plot,
             x="population_density",
@@ -802,8 +962,10 @@ def tsai_2023_sec_2_5_experiment(
             },
         )
         .label(x="Population Density", y=f"{vehicle_title} Stock Density")
-        .layout(size=(6, 4))
-        .save(Path(result_dir, f"tsai-2023-sec-2-5.pdf"))
+        .layout(size=(6, 4)),
+        df_plot,
+        Path(result_dir, f"tsai-2023-sec-2-5.pdf"),
+        skip_plots=skip_plots,
     )
 
 
@@ -812,10 +974,12 @@ def tsai_2023_sec_3_1_experiment(
     result_dir: Path,
     bootstrap_fit_runs: int = 1000,
     bootstrap_predict_runs: int = 1000,
+    n_jobs: int = 1,
     integrate_sigma: float = 64,
     quantiles: Iterable[float] = np.arange(0, 1.001, 0.025),
     predict_years: Iterable[int] = np.arange(2022, 2051),
     plot_years: Iterable[int] = np.arange(2000, 2051),
+    skip_plots: bool = False,
 ):
     logging.info("Running Tsai 2023 Section 3.1 experiment.")
 
@@ -841,6 +1005,7 @@ def tsai_2023_sec_3_1_experiment(
                 pipeline = CarStockPipeline(
                     data_dir=data_dir,
                     bootstrap_fit_runs=bootstrap_fit_runs,
+                    n_jobs=n_jobs,
                     bootstrap_predict_runs=bootstrap_predict_runs,
                     integrate_sigma=integrate_sigma,
                     quantiles=quantiles,
@@ -849,6 +1014,7 @@ def tsai_2023_sec_3_1_experiment(
                 pipeline = ScooterStockPipeline(
                     data_dir=data_dir,
                     bootstrap_fit_runs=bootstrap_fit_runs,
+                    n_jobs=n_jobs,
                     bootstrap_predict_runs=bootstrap_predict_runs,
                     integrate_sigma=integrate_sigma,
                     quantiles=quantiles,
@@ -857,6 +1023,7 @@ def tsai_2023_sec_3_1_experiment(
                 pipeline = OperatingCarStockPipeline(
                     data_dir=data_dir,
                     bootstrap_fit_runs=bootstrap_fit_runs,
+                    n_jobs=n_jobs,
                     bootstrap_predict_runs=bootstrap_predict_runs,
                     quantiles=quantiles,
                 )
@@ -864,6 +1031,7 @@ def tsai_2023_sec_3_1_experiment(
                 pipeline = TruckStockPipeline(
                     data_dir=data_dir,
                     bootstrap_fit_runs=bootstrap_fit_runs,
+                    n_jobs=n_jobs,
                     bootstrap_predict_runs=bootstrap_predict_runs,
                     quantiles=quantiles,
                 )
@@ -871,47 +1039,45 @@ def tsai_2023_sec_3_1_experiment(
                 pipeline = BusStockPipeline(
                     data_dir=data_dir,
                     bootstrap_fit_runs=bootstrap_fit_runs,
+                    n_jobs=n_jobs,
                     bootstrap_predict_runs=bootstrap_predict_runs,
                     quantiles=quantiles,
                 )
             case _:
                 raise ValueError(f"Invalid vehicle={vehicle}")
 
-        years: Iterable[int] = sorted(set().union(existing_years).union(predict_years))
-        for year in rp.track(years, description=vehicle):
-            logging.info(f"Running year={year}")
-
-            df_plot: pd.DataFrame = pipeline(year=year)
+        years: np.ndarray = np.asarray(
+            sorted(set().union(existing_years).union(predict_years))
+        )
+        logging.info(f"Running years={years}")
 
-            df_group: pd.DataFrame
-            if year in existing_years:
-                df_group = pd.DataFrame(
-                    {
-                        "percentage": [0.5],
-                        "group": [PlotGroup.PREDICTION_OF_EXISTING],
-                    },
-                )
-            else:
-                df_group = pd.DataFrame(
-                    {
-                        "percentage": [0.025, 0.5, 0.975],
-                        "group": [
-                            PlotGroup.PREDICTION_CI_LOW,
-                            PlotGroup.PREDICTION,
-                            PlotGroup.PREDICTION_CI_HIGH,
-                        ],
-                    },
-                )
+        df_prediction: pd.DataFrame = pipeline.predict_many(years)
 
-            # this is to ensure the floats match up in numerical accuracy
-            df_plot["percentage"] = df_plot["percentage"].astype(np.float32)
-            df_group["percentage"] = df_group["percentage"].astype(np.float32)
+        # existing years only keep the median, and predicted years keep the interval
+        percentage: np.ndarray = df_prediction["percentage"].values
+        is_existing: np.ndarray = df_prediction["year"].isin(existing_years).values
+        group_masks: list[tuple[PlotGroup, np.ndarray]] = [
+            (
+                PlotGroup.PREDICTION_OF_EXISTING,
+                is_existing & np.isclose(percentage, 0.5),
+            ),
+            (
+                PlotGroup.PREDICTION_CI_LOW,
+                ~is_existing & np.isclose(percentage, 0.025),
+            ),
+            (PlotGroup.PREDICTION, ~is_existing & np.isclose(percentage, 0.5)),
+            (
+                PlotGroup.PREDICTION_CI_HIGH,
+                ~is_existing & np.isclose(percentage, 0.975),
+            ),
+        ]
+        df_prediction["group"] = None
+        for group, mask in group_masks:
+            df_prediction.loc[mask, "group"] = group
 
-            df_plots.append(
-                df_plot.merge(df_group, how="left", on="percentage").assign(year=year)
-            )
+        df_plots.append(df_prediction)
 
-        df_plot = pd.concat(df_plots, ignore_index=True)
+        df_plot = with_plot_dtypes(pd.concat(df_plots, ignore_index=True))
 
         # offset the predicted vehicle stock to match the existing vehicle stock
 
@@ -938,7 +1104,7 @@ def tsai_2023_sec_3_1_experiment(
             ("adjusted_vehicle_ownership", f"Stock Per Capita"),
         ]
         for column, title in column_titles:
-            (
+            save_plot(
                 so.Plot(
                     df_plot,
                     x="year",
@@ -980,8 +1146,10 @@ def tsai_2023_sec_3_1_experiment(
                     },
                 )
                 .label(x="Year", y=f"{vehicle_title} {title}")
-                .layout(size=(6, 4))
-                .save(Path(result_dir, f"tsai-2023-sec-3-1-{vehicle_str}-{column}.pdf"))
+                .layout(size=(6, 4)),
+                df_plot,
+                Path(result_dir, f"tsai-2023-sec-3-1-{vehicle_str}-{column}.pdf"),
+                skip_plots=skip_plots,
             )
 
         # save csv
@@ -1001,6 +1169,7 @@ def tsai_2023_sec_3_2_experiment(
     data_dir: Path,
     result_dir: Path,
     years: Iterable[int] = range(2012, 2051),
+    skip_plots: bool = False,
 ) -> None:
     for vehicle, scenario in itertools.product(
         [Vehicle.CAR, Vehicle.SCOOTER],
@@ -1038,26 +1207,55 @@ def tsai_2023_sec_3_2_experiment(
             df_vehicle_age_composition_by_year=df_vehicle_age_composition_by_year,
             result_dir=result_dir,
             prefix=f"tsai-2023-sec-3-2-{vehicle_str}-{scenario}",
+            skip_plots=skip_plots,
         )
 
 
 def main(_):
     py_logging.getLogger("matplotlib.category").setLevel(py_logging.WARNING)
-    warnings.filterwarnings("ignore", category=scipy.integrate.IntegrationWarning)
+    py_logging.getLogger("numba").setLevel(py_logging.WARNING)
 
     logging.set_verbosity(logging.INFO)
 
     Path(FLAGS.result_dir).mkdir(parents=True, exist_ok=True)
 
-    vehicle_subsidy(FLAGS.data_dir, FLAGS.result_dir)
-    tsai_2023_sec_2_2_1_experiment(FLAGS.data_dir, FLAGS.result_dir)
-    tsai_2023_sec_2_2_2_experiment(FLAGS.data_dir, FLAGS.result_dir)
-    tsai_2023_sec_2_2_3_experiment(FLAGS.data_dir, FLAGS.result_dir)
-    tsai_2023_sec_2_3_experiment(FLAGS.data_dir, FLAGS.result_dir)
-    tsai_2023_sec_2_4_experiment(FLAGS.data_dir, FLAGS.result_dir)
-    tsai_2023_sec_2_5_experiment(FLAGS.data_dir, FLAGS.result_dir)
-    tsai_2023_sec_3_1_experiment(FLAGS.data_dir, FLAGS.result_dir)
-    tsai_2023_sec_3_2_experiment(FLAGS.data_dir, FLAGS.result_dir)
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=min(8, os.cpu_count() or 1)
+    ) as executor:
+        futures: list[concurrent.futures.Future] = [
+            executor.submit(
+                fn, FLAGS.data_dir, FLAGS.result_dir, skip_plots=FLAGS.skip_plots
+            )
+            for fn in [
+                tsai_2023_sec_2_2_1_experiment,
+                tsai_2023_sec_2_2_2_experiment,
+                tsai_2023_sec_2_2_3_experiment,
+                tsai_2023_sec_2_3_experiment,
+                tsai_2023_sec_2_4_experiment,
+                tsai_2023_sec_2_5_experiment,
+            ]
+        ]
+
+        # 3.1 runs in this process meanwhile, as it spreads its bootstrap fits over
+        # worker processes of its own, which cannot be nested in the executor's
+        tsai_2023_sec_3_1_experiment(
+            FLAGS.data_dir,
+            FLAGS.result_dir,
+            n_jobs=os.cpu_count() or 1,
+            skip_plots=FLAGS.skip_plots,
+        )
+        for future in futures:
+            future.result()
+
+        # these read the results of 2.2.1 and 3.1 from `result_dir`
+        futures = [
+            executor.submit(
+                fn, FLAGS.data_dir, FLAGS.result_dir, skip_plots=FLAGS.skip_plots
+            )
+            for fn in [vehicle_subsidy, tsai_2023_sec_3_2_experiment]
+        ]
+        for future in futures:
+            future.result()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,68 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+import seaborn.objects as so
+
+from main import PlotAccumulator, PlotGroup, get_plot_spec, save_plot
+
+
+def test_plot_accumulator_mixed_columns():
+    plot_accumulator = PlotAccumulator()
+    plot_accumulator.add_block(
+        year=np.asarray([2000, 2001]),
+        vehicle_stock=np.asarray([1.0, 2.0]),
+        group=PlotGroup.EXISTING,
+    )
+    plot_accumulator.add_block(
+        year=np.asarray([2002]),
+        percentage=np.asarray([0.5]),
+        fuel=np.asarray(["internal_combustion"]),
+    )
+    df: pd.DataFrame = plot_accumulator.to_frame()
+
+    assert df["year"].tolist() == [2000, 2001, 2002]
+    np.testing.assert_array_equal(df["vehicle_stock"], [1.0, 2.0, np.nan])
+    np.testing.assert_array_equal(df["percentage"], [np.nan, np.nan, 0.5])
+    assert df["group"].tolist()[:2] == [PlotGroup.EXISTING, PlotGroup.EXISTING]
+    assert pd.isna(df["group"].iloc[2])
+
+    # string columns are padded with missing values rather than the string "nan"
+    assert df["fuel"].isna().tolist() == [True, True, False]
+    assert df["fuel"].iloc[2] == "internal_combustion"
+
+
+def test_get_plot_spec():
+    df: pd.DataFrame = pd.DataFrame({"year": [2000, 2001], "vehicle_stock": [1, 2]})
+
+    def get_plot(df: pd.DataFrame, color: str) -> so.Plot:
+        return (
+            so.Plot(df, x="year", y="vehicle_stock")
+            .add(so.Line(color=color))
+            .label(x="Year")
+        )
+
+    # the spec is stable across plots, does not depend on the data, and covers marks
+    assert get_plot_spec(get_plot(df, "b")) == get_plot_spec(get_plot(df, "b"))
+    assert get_plot_spec(get_plot(df, "b")) == get_plot_spec(get_plot(df * 2, "b"))
+    assert get_plot_spec(get_plot(df, "b")) != get_plot_spec(get_plot(df, "r"))
+
+
+def test_save_plot_without_spec(monkeypatch: pytest.MonkeyPatch, tmp_path: Path):
+    df: pd.DataFrame = pd.DataFrame({"year": [2000, 2001], "vehicle_stock": [1, 2]})
+    plot: so.Plot = so.Plot(df, x="year", y="vehicle_stock").add(so.Line())
+
+    saved_paths: list[Path] = []
+    monkeypatch.setattr(plot, "save", lambda path, **kwargs: saved_paths.append(path))
+    # a seaborn release without the private attributes read for the spec
+    monkeypatch.delattr(plot, "_layers")
+    assert get_plot_spec(plot) is None
+
+    # without a spec the plot cannot be told unchanged, and is rendered every time
+    path: Path = tmp_path / "plot.pdf"
+    save_plot(plot, df, path)
+    save_plot(plot, df, path)
+
+    assert saved_paths == [path, path]
+    assert not path.with_name("plot.pdf.hash").exists()
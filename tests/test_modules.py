@@ -0,0 +1,225 @@
+import numpy as np
+import pytest
+import scipy.optimize
+import sympy as sp
+
+from app.modules import (
+    BootstrapModule,
+    CarOwnershipModuleV2,
+    LinearModule,
+    SigmoidCurveModule,
+)
+
+
+def get_ownership_data(
+    rng: np.random.Generator, num_samples: int = 40
+) -> tuple[np.ndarray, np.ndarray]:
+    income: np.ndarray = np.linspace(200_000, 3_000_000, num_samples)
+    ownership: np.ndarray = 0.8 / (1 + np.exp(-(income / 1_000_000 - 1.2) * 3))
+    ownership += rng.normal(0, 0.01, size=num_samples)
+
+    return income, ownership
+
+
+def get_linear_data(
+    rng: np.random.Generator, num_samples: int = 30
+) -> tuple[np.ndarray, np.ndarray]:
+    X: np.ndarray = rng.normal(size=(num_samples, 2))
+    y: np.ndarray = X @ np.array([1.5, -2.0]) + 0.5
+    y += rng.normal(0, 0.1, size=num_samples)
+
+    return X, y
+
+
+def test_linear_module_fit_weighted():
+    rng: np.random.Generator = np.random.default_rng(0)
+    X, y = get_linear_data(rng)
+
+    module = LinearModule(input_dims=2)
+    # index: (run, sample)
+    weights: np.ndarray = rng.multinomial(len(X), np.full(len(X), 1 / len(X)), size=5)
+    param_values_list: list[dict[sp.Basic, float]] = module._fit_weighted(weights, X, y)
+
+    for _weights, param_values in zip(weights, param_values_list):
+        sampled_index: np.ndarray = np.repeat(np.arange(len(X)), _weights)
+        X_one: np.ndarray = np.c_[X[sampled_index], np.ones(len(sampled_index))]
+        a_one, _, _, _ = np.linalg.lstsq(X_one, y[sampled_index], rcond=None)
+
+        np.testing.assert_allclose(
+            [
+                param_values[module.a[0]],
+                param_values[module.a[1]],
+                param_values[module.b],
+            ],
+            a_one,
+            rtol=1e-8,
+        )
+
+
+def test_module_subs_arrays():
+    a: np.ndarray = sp.symarray("a", (2, 2))
+    values: np.ndarray = np.arange(4.0).reshape(2, 2)
+
+    substituted: dict[str, np.ndarray] = LinearModule.subs(
+        {"a": a, "values": values}, dict(zip(a.flat, values.flat))
+    )
+
+    # numeric arrays are passed through, and object arrays substituted element-wise
+    assert substituted["values"] is values
+    assert substituted["a"].shape == (2, 2)
+    np.testing.assert_array_equal(substituted["a"].astype(np.float64), values)
+
+
+def test_sigmoid_curve_module_fit():
+    income, ownership = get_ownership_data(np.random.default_rng(0))
+    x: np.ndarray = income / 1_000_000
+    p0: list[float] = [np.max(ownership), 1.0, -1.0]
+
+    module = SigmoidCurveModule()
+    param_values: dict[sp.Basic, float] = module._fit(x, ownership, p0=p0)
+
+    # the trust region solver lands on the same optimum as levenberg-marquardt
+    popt, _ = scipy.optimize.curve_fit(
+        lambda x, gamma, alpha, beta: gamma
+        * (1 - alpha * (1 - 1 / (1 + np.exp(-beta * x)))),
+        x,
+        ownership,
+        p0=p0,
+    )
+    np.testing.assert_allclose(
+        [
+            param_values[module.gamma],
+            param_values[module.alpha],
+            param_values[module.beta],
+        ],
+        popt,
+        rtol=1e-4,
+    )
+
+
+def test_module_fit_bootstrap_reproducible():
+    X, y = get_linear_data(np.random.default_rng(0))
+
+    module = LinearModule(input_dims=2)
+    param_values_lists: list[list[dict[sp.Basic, float]]] = [
+        module.fit_bootstrap(5, X, y, rng=np.random.default_rng(1)) for _ in range(2)
+    ]
+
+    assert param_values_lists[0] == param_values_lists[1]
+    # the replicates are resampled independently of each other
+    assert param_values_lists[0][0] != param_values_lists[0][1]
+
+
+def test_module_resample_copies():
+    X, y = get_linear_data(np.random.default_rng(0))
+    income: np.ndarray = np.linspace(0, 1, len(y))
+
+    module = LinearModule(input_dims=2)
+    sampled_index: np.ndarray = np.arange(len(y))[::-1]
+    (_X, _y), kwargs = module._resample(sampled_index, (X, y), {"income": income})
+    (__X, __y), _ = module._resample(sampled_index, (X, y), {"income": income})
+
+    np.testing.assert_array_equal(_X, X[sampled_index])
+    np.testing.assert_array_equal(_y, y[sampled_index])
+    np.testing.assert_array_equal(kwargs["income"], income[sampled_index])
+
+    # a later resample never overwrites the arrays handed out by an earlier one
+    assert not np.shares_memory(_y, __y)
+
+
+def test_module_numba_backend():
+    numba = pytest.importorskip("numba")
+    income, ownership = get_ownership_data(np.random.default_rng(0))
+
+    module = CarOwnershipModuleV2()
+    module.fit(bootstrap=False, income=income, ownership=ownership)
+    numba_module = CarOwnershipModuleV2()
+    numba_module.backend = "numba"
+    numba_module.param_by_symbol = module.param_by_symbol
+    numba_module.param_values = module.param_values
+
+    # scalars go through the jitted function, and arrays through the compiled ufunc
+    for income_value in [1_500_000.0, np.linspace(0, 2_000_000, 5)]:
+        np.testing.assert_allclose(
+            numba_module(output=module.ownership, income=income_value),
+            module(output=module.ownership, income=income_value),
+            rtol=1e-12,
+        )
+
+    # the array evaluation did not fall back to numpy
+    assert any(
+        isinstance(fn, numba.np.ufunc.dufunc.DUFunc)
+        for fn in numba_module._lambdified.values()
+    )
+
+
+def test_ownership_module_get_ownership():
+    income, ownership = get_ownership_data(np.random.default_rng(0))
+
+    module = CarOwnershipModuleV2()
+    module.fit(bootstrap=False, income=income, ownership=ownership)
+    assert module.param_values is not None
+
+    income_values: np.ndarray = np.linspace(0, 2_000_000, 5)
+    np.testing.assert_allclose(
+        module.get_ownership(income_values, module.param_values),
+        module(output=module.ownership, income=income_values),
+        rtol=1e-12,
+    )
+
+
+def test_bootstrap_module_stacked_call():
+    income, ownership = get_ownership_data(np.random.default_rng(0))
+
+    module = CarOwnershipModuleV2()
+    bootstrap_module = BootstrapModule(module=module, runs=4)
+    bootstrap_module.fit(income=income, ownership=ownership)
+    assert bootstrap_module.param_by_symbol_list is not None
+
+    income_values: np.ndarray = np.linspace(0, 2_000_000, 5)
+    # index: (run, income)
+    stacked: np.ndarray = bootstrap_module(
+        output=module.ownership, income=income_values
+    )
+    expected: np.ndarray = np.array(
+        [
+            [
+                float(
+                    module.subs(
+                        module.ownership,
+                        {module.income: sp.Float(_income / 1_000_000)}
+                        | param_by_symbol,
+                    )
+                )
+                for _income in income_values
+            ]
+            for param_by_symbol in bootstrap_module.param_by_symbol_list
+        ]
+    )
+
+    assert stacked.shape == (4, 5)
+    np.testing.assert_allclose(stacked, expected, rtol=1e-10)
+
+    # the wrapped module is left untouched by the stacked evaluation
+    assert module.param_by_symbol is None
+    assert module.param_values is None
+
+
+def test_bootstrap_module_fit_n_jobs():
+    income, ownership = get_ownership_data(np.random.default_rng(0))
+
+    param_values_lists: list[list[dict[sp.Basic, float]]] = []
+    for n_jobs in [1, 2]:
+        bootstrap_module = BootstrapModule(
+            module=CarOwnershipModuleV2(),
+            runs=4,
+            n_jobs=n_jobs,
+            rng=np.random.default_rng(1),
+        )
+        bootstrap_module.fit(income=income, ownership=ownership)
+        assert bootstrap_module.param_values_list is not None
+
+        param_values_lists.append(bootstrap_module.param_values_list)
+
+    # the replicates are drawn from the same seeds however many workers fit them
+    assert param_values_lists[0] == param_values_lists[1]
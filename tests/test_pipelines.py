@@ -0,0 +1,129 @@
+from collections.abc import Callable
+
+import numpy as np
+import pandas as pd
+import pytest
+import scipy.integrate
+import scipy.stats
+
+import app.pipelines.tsai_2023 as tsai_2023_pipelines
+from app.pipelines import CarStockPipeline, ScooterStockPipeline
+
+YEARS: np.ndarray = np.arange(2000, 2022)
+
+
+def get_year_series(
+    value: float, slope: float, extrapolate_index: pd.Index | None = None
+) -> pd.Series:
+    index: pd.Index = (
+        pd.Index(YEARS, name="year") if extrapolate_index is None else extrapolate_index
+    )
+    return pd.Series(value + slope * (index.values - YEARS[0]), index=index)
+
+
+def car_ownership(income: np.ndarray) -> np.ndarray:
+    return 0.6 * (1 - 0.8 * (1 - 1 / (1 + np.exp(income / 1_000_000))))
+
+
+def scooter_ownership(income: np.ndarray) -> np.ndarray:
+    income_in_millions: np.ndarray = income / 1_000_000
+    return 1.5**2 * income_in_millions * np.exp(-1.5 * income_in_millions) + 0.3
+
+
+@pytest.fixture(scope="function")
+def ownership_fn(monkeypatch: pytest.MonkeyPatch, request) -> Callable:
+    fn: Callable = request.param
+
+    income: np.ndarray = np.linspace(200_000, 3_000_000, 40)
+    ownership: np.ndarray = fn(income) + np.random.default_rng(0).normal(0, 0.005, 40)
+
+    monkeypatch.setattr(
+        tsai_2023_pipelines,
+        "get_tsai_sec_2_2_3_data",
+        lambda data_dir, vehicle, income_bins: pd.DataFrame(
+            {"adjusted_income": income, "adjusted_vehicle_ownership": ownership}
+        ),
+    )
+    monkeypatch.setattr(
+        tsai_2023_pipelines,
+        "get_income_dataframe",
+        lambda data_dir: get_year_series(500_000, 10_000)
+        .rename("adjusted_income")
+        .to_frame(),
+    )
+    monkeypatch.setattr(
+        tsai_2023_pipelines,
+        "get_gini_series",
+        lambda data_dir, extrapolate_index=None: get_year_series(
+            0.3, 0.001, extrapolate_index
+        ),
+    )
+    monkeypatch.setattr(
+        tsai_2023_pipelines,
+        "get_population_series",
+        lambda data_dir, extrapolate_index=None: get_year_series(
+            22_000_000, 10_000, extrapolate_index
+        ),
+    )
+
+    return fn
+
+
+@pytest.mark.parametrize(
+    "pipeline_cls,ownership_fn",
+    [
+        (CarStockPipeline, car_ownership),
+        (ScooterStockPipeline, scooter_ownership),
+    ],
+    indirect=["ownership_fn"],
+)
+def test_stock_pipeline_integration(
+    pipeline_cls: type[CarStockPipeline], ownership_fn: Callable
+):
+    # a single fitted replicate, with years that have a known mean income, makes every
+    # predicted run the same integral
+    pipeline: CarStockPipeline = pipeline_cls(
+        data_dir=".",
+        bootstrap_fit_runs=1,
+        bootstrap_predict_runs=4,
+        integrate_sigma=8,
+        quantiles=(0.5,),
+    )
+    years: np.ndarray = np.asarray([2005, 2015])
+    df: pd.DataFrame = pipeline.predict_many(years)
+
+    module = pipeline.vehicle_ownership_module
+    pipeline.bootstrap_vehicle_ownership_module._set_module_params(0)
+
+    for year in years:
+        mean_income: float = pipeline.df_income.loc[year, "adjusted_income"]
+        gini: float = 0.3 + 0.001 * (year - YEARS[0])
+        alpha, beta = pipeline.income_distribution_module.get_params(mean_income, gini)
+
+        vehicle_ownership_val, _ = scipy.integrate.quad(
+            lambda income: module(output=module.ownership, income=income)
+            * scipy.stats.fisk.pdf(income, beta, scale=alpha),
+            0,
+            pipeline.integrate_sigma * mean_income,
+        )
+
+        # the fixed gauss-legendre rule is not exact, and has been seen to be off from
+        # adaptive quadrature by up to about 1.4e-4 on the real data
+        np.testing.assert_allclose(
+            df.loc[df["year"] == year, "adjusted_vehicle_ownership"],
+            vehicle_ownership_val,
+            rtol=5e-4,
+        )
+
+
+@pytest.mark.parametrize("ownership_fn", [car_ownership], indirect=True)
+def test_car_stock_pipeline_rngs(ownership_fn: Callable):
+    pipeline: CarStockPipeline = CarStockPipeline(data_dir=".", bootstrap_fit_runs=4)
+
+    # the income and ownership runs are not drawn in lockstep
+    income_rng = pipeline.bootstrap_income_module.rng
+    ownership_rng = pipeline.bootstrap_vehicle_ownership_module.rng
+    assert income_rng is not None and ownership_rng is not None
+    assert not np.array_equal(
+        income_rng.integers(0, 4, size=16), ownership_rng.integers(0, 4, size=16)
+    )